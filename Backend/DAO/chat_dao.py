@@ -79,6 +79,44 @@ class ChatDAO:
 
         return history
 
+    @staticmethod
+    def get_messages_after(chat_id, user_message_id=None, ai_message_id=None):
+        """
+        Mensagens (usuário e IA) do chat em ordem cronológica.
+        Os ids são cursores de cada tabela: só entram as mensagens com id maior
+        (as anteriores já estão no resumo).
+        """
+        user_query = UserMessage.query.filter_by(chat_id=chat_id)
+        ai_query = AIMessage.query.filter_by(chat_id=chat_id)
+        if user_message_id is not None:
+            user_query = user_query.filter(UserMessage.id > user_message_id)
+        if ai_message_id is not None:
+            ai_query = ai_query.filter(AIMessage.id > ai_message_id)
+
+        all_msgs = user_query.all() + ai_query.all()
+        all_msgs.sort(key=lambda m: getattr(m, "created_at", None))
+
+        return [
+            {
+                "id": message.id,
+                "role": "user" if isinstance(message, UserMessage) else "assistant",
+                "content": message.content,
+                "created_at": message.created_at,
+            }
+            for message in all_msgs
+        ]
+
+    @staticmethod
+    def update_history_summary(chat_id, summary, user_message_id, ai_message_id):
+        chat = ChatDAO.get_chat_by_id(chat_id)
+        if not chat:
+            return None
+        chat.history_summary = summary
+        chat.summary_user_message_id = user_message_id
+        chat.summary_ai_message_id = ai_message_id
+        db.session.commit()
+        return chat
+
     @staticmethod
     def get_rating_by_chat(chat_id):
         chat = ChatDAO.get_chat_by_id(chat_id)
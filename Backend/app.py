@@ -37,6 +37,7 @@ def create_app():
     from router.dashboard_router import dashboard_bp
     from router.admin_router import admin_bp
     from router.documents_router import documents_bp
+    from router.health_router import health_bp, RAG_WARMUP
 
     # Register blueprints
     app.register_blueprint(auth_bp)
@@ -49,6 +50,12 @@ def create_app():
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(documents_bp, url_prefix='/documents')
+    app.register_blueprint(health_bp)
+
+    # Aquecimento opcional do RAG em background (por worker; não usar com --preload do Gunicorn)
+    if RAG_WARMUP:
+        from services.rag_service import RAGService
+        RAGService.start_warm_up()
 
     return app
 
@@ -0,0 +1,200 @@
+# Benchmark de qualidade e latência do RAG
+#
+# Uso (a partir da pasta Backend, depois de rodar setup_laws.py):
+#   python benchmarks/rag_benchmark.py
+#   python benchmarks/rag_benchmark.py --modes hybrid lexical --k 5 --output /tmp/rag.json
+#
+# Indexa data/laws_txt em um diretório temporário (não toca no banco real),
+# roda as perguntas rotuladas de rag_questions.json e grava um JSON com
+# recall@k, MRR, latência p50/p95, vazão de ingestão e tamanho do índice.
+# Com --embeddings, cada backend de embedding é medido em uma rodada própria:
+#   python benchmarks/rag_benchmark.py --embeddings default onnx-int8 --modes vector hybrid
+# Com --sharded, indexa uma coleção por norma (fan-out paralelo na busca):
+#   python benchmarks/rag_benchmark.py --sharded --modes vector
+# Com --snapshot, a busca vetorial usa o snapshot mmap exportado após a indexação:
+#   python benchmarks/rag_benchmark.py --snapshot int8 --modes vector hybrid
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.rag_service import RAGService, SHARDED_COLLECTIONS, ingest_text_file  # noqa: E402
+from services.legal_chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNKER_VERSION  # noqa: E402
+from services.embedding_backends import EMBEDDING_BACKEND, EMBEDDING_BACKENDS  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAWS_DIR = os.path.join(BASE_DIR, "..", "data", "laws_txt")
+QUESTIONS_PATH = os.path.join(BASE_DIR, "rag_questions.json")
+RESULTS_DIR = os.path.join(BASE_DIR, "results")
+
+
+def percentile(values, pct):
+    """Percentil por posição mais próxima (suficiente para dezenas de amostras)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def ingest_corpus(max_tokens, overlap):
+    files = sorted(f for f in os.listdir(LAWS_DIR) if f.endswith(".txt"))
+    started = time.perf_counter()
+    chunks = 0
+    for filename in files:
+        chunks += ingest_text_file(
+            os.path.join(LAWS_DIR, filename),
+            source_name=filename,
+            max_tokens=max_tokens,
+            overlap_tokens=overlap,
+            save_indexes=False,
+        )
+    RAGService.save_indexes()
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(files),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def evaluate(questions, mode, k):
+    # Primeira consulta fora da medição (carrega modelo/índices)
+    RAGService.retrieve(questions[0]["question"], n_results=k, mode=mode)
+
+    latencies, recalls, reciprocal_ranks, details = [], [], [], []
+    for item in questions:
+        expected = {tuple(e) for e in item["expected"]}
+
+        started = time.perf_counter()
+        hits = RAGService.retrieve(item["question"], n_results=k, mode=mode)[:k]
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        found = [(h["metadata"].get("law"), h["metadata"].get("article")) for h in hits]
+        relevant_ranks = [rank for rank, key in enumerate(found, start=1) if key in expected]
+
+        recalls.append(len(expected & set(found)) / len(expected))
+        reciprocal_ranks.append(1.0 / relevant_ranks[0] if relevant_ranks else 0.0)
+        details.append({
+            "question": item["question"],
+            "first_relevant_rank": relevant_ranks[0] if relevant_ranks else None,
+            "retrieved": [f"{law}|{article}" for law, article in found],
+        })
+
+    n = len(questions)
+    return {
+        f"recall_at_{k}": round(sum(recalls) / n, 4),
+        "mrr": round(sum(reciprocal_ranks) / n, 4),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "mean": round(sum(latencies) / n, 3),
+        },
+        "questions": details,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperação do RAG")
+    parser.add_argument("--k", type=int, default=3, help="Trechos recuperados por pergunta")
+    parser.add_argument("--modes", nargs="+", default=["vector", "lexical", "hybrid"])
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--embeddings", nargs="+", default=[EMBEDDING_BACKEND], choices=sorted(EMBEDDING_BACKENDS))
+    parser.add_argument("--sharded", action=argparse.BooleanOptionalAction, default=SHARDED_COLLECTIONS, help="Uma coleção por norma")
+    parser.add_argument("--snapshot", choices=["float32", "int8"], help="Busca vetorial pelo snapshot mmap com esse dtype")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: benchmarks/results/rag_<commit>.json)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(LAWS_DIR):
+        print("data/laws_txt não encontrado. Rode setup_laws.py antes do benchmark.")
+        sys.exit(1)
+
+    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    commit = git_commit()
+    runs = {}
+    for backend in args.embeddings:
+        with tempfile.TemporaryDirectory(prefix="rag_bench_") as data_dir:
+            RAGService.configure(data_dir, embedding_backend=backend, sharded=args.sharded, vector_store="chroma")
+
+            print(f"[{backend}] Indexando corpus...")
+            ingestion = ingest_corpus(args.max_tokens, args.overlap)
+            index = {
+                "chunks": len(RAGService.get_lexical_index()),
+                "bytes": dir_size(data_dir),
+            }
+            if args.snapshot:
+                RAGService.export_snapshot(dtype=args.snapshot)
+                RAGService.configure(vector_store="snapshot")
+                index["snapshot_bytes"] = dir_size(RAGService.snapshot_path())
+
+            modes = {}
+            for mode in args.modes:
+                print(f"[{backend}] Avaliando modo {mode}...")
+                modes[mode] = evaluate(questions, mode, args.k)
+
+        runs[backend] = {"ingestion": ingestion, "index": index, "modes": modes}
+
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "config": {
+            "k": args.k,
+            "max_tokens": args.max_tokens,
+            "overlap": args.overlap,
+            "chunker_version": CHUNKER_VERSION,
+            "sharded": args.sharded,
+            "snapshot": args.snapshot,
+            "questions": len(questions),
+        },
+        "runs": runs,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"rag_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    for backend, run in runs.items():
+        ingestion, index = run["ingestion"], run["index"]
+        print(f"\n== {backend} ==")
+        print(f"Ingestão: {ingestion['chunks']} chunks, {ingestion['chunks_per_second']} chunks/s")
+        print(f"Índice: {index['chunks']} chunks, {index['bytes'] / 1024:.1f} KiB")
+        for mode, res in run["modes"].items():
+            lat = res["latency_ms"]
+            print(
+                f"{mode:>8}: recall@{args.k}={res[f'recall_at_{args.k}']:.3f} "
+                f"MRR={res['mrr']:.3f} p50={lat['p50']:.2f}ms p95={lat['p95']:.2f}ms"
+            )
+    print(f"Resultados gravados em {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,31 @@
 # Script para rodar manualmente e popular o banco vetorial
 import os
-from services.rag_service import ingest_text_file
+import time
+import argparse
+from services.rag_service import RAGService, ingest_text_file, INGEST_BATCH_SIZE, INGEST_WORKERS, SHARDED_COLLECTIONS
+from services.ingest_manifest import IngestManifest
+from services.legal_chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from services.tokens import tokenizer_name
+from services.embedding_backends import EMBEDDING_BACKEND, EMBEDDING_BACKENDS
 
 def main():
+    parser = argparse.ArgumentParser(description="Ingestão das leis em data/laws_txt para o RAG")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Trechos por upsert no Chroma")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Processos para cálculo de embeddings")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS, help="Tamanho máximo de cada chunk em tokens")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS, help="Tokens repetidos entre chunks do mesmo artigo")
+    parser.add_argument("--embedding", default=EMBEDDING_BACKEND, choices=sorted(EMBEDDING_BACKENDS), help="Backend de embedding (cada um tem sua coleção)")
+    parser.add_argument("--sharded", action=argparse.BooleanOptionalAction, default=SHARDED_COLLECTIONS, help="Uma coleção por norma (padrão: RAG_SHARDED_COLLECTIONS)")
+    parser.add_argument("--export-snapshot", action="store_true", help="Exporta o snapshot vetorial somente-leitura (RAG_VECTOR_STORE=snapshot) ao final")
+    parser.add_argument("--snapshot-dtype", default="float32", choices=["float32", "int8"], help="Tipo da matriz do snapshot")
+    parser.add_argument("--full", action="store_true", help="Apaga a coleção e reindexa todos os arquivos do zero")
+    args = parser.parse_args()
+
+    RAGService.configure(embedding_backend=args.embedding, sharded=args.sharded)
+
     print("--- INICIANDO INGESTÃO DE LEIS PARA RAG ---")
+    if tokenizer_name() != "cl100k_base":
+        print("AVISO: tiktoken sem o BPE cl100k_base; chunks medidos por palavra podem passar de --max-tokens")
     
     laws_dir = os.path.join(os.path.dirname(__file__), "data/laws_txt")
     
@@ -19,12 +41,62 @@ def main():
         print("Nenhum arquivo .txt encontrado em data/laws_txt")
         return
 
+    manifest_path = RAGService.manifest_path()
+    # Sem manifesto (ou sem os índices desta coleção) não dá para saber o que já está indexado
+    # (ex: ids de ingestões antigas): reconstrói do zero, assim como no --full
+    tracked = (manifest_path, RAGService.lexical_index_path(), RAGService.citation_index_path())
+    if args.full or not all(os.path.exists(path) for path in tracked):
+        dropped = RAGService.reset()
+        if dropped:
+            print(f"Coleção reiniciada ({dropped} coleções apagadas)")
+        manifest = IngestManifest(manifest_path)
+    else:
+        manifest = IngestManifest.load(manifest_path)
+
+    # Arquivos que saíram da pasta têm seus chunks apagados da coleção
+    for source_name in manifest.sources():
+        if source_name not in files:
+            removed = RAGService.delete_documents(manifest.remove_file(source_name), persist=False)
+            print(f"Removido: {source_name} ({removed} chunks)")
+
+    total_chunks = 0
+    started = time.perf_counter()
+
     for filename in files:
         filepath = os.path.join(laws_dir, filename)
         print(f"Processando {filename}...")
-        ingest_text_file(filepath, source_name=filename)
+        file_started = time.perf_counter()
+        indexed = ingest_text_file(
+            filepath,
+            source_name=filename,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            manifest=manifest,
+            max_tokens=args.max_tokens,
+            overlap_tokens=args.overlap,
+            save_indexes=False,
+        )
+        elapsed = time.perf_counter() - file_started
+        total_chunks += indexed
+        if indexed:
+            print(f"  {indexed} chunks em {elapsed:.2f}s ({indexed / elapsed:.1f} chunks/s)")
+
+    # Índices auxiliares gravados uma vez só, junto com o manifesto
+    RAGService.save_indexes()
+    manifest.save()
+
+    elapsed = time.perf_counter() - started
+    rate = total_chunks / elapsed if elapsed > 0 else 0.0
+    print(f"Total: {total_chunks} chunks em {elapsed:.2f}s ({rate:.1f} chunks/s)")
 
+    if args.export_snapshot:
+        snapshot_started = time.perf_counter()
+        exported = RAGService.export_snapshot(dtype=args.snapshot_dtype)
+        print(
+            f"Snapshot ({args.snapshot_dtype}): {exported} vetores em "
+            f"{time.perf_counter() - snapshot_started:.2f}s -> {RAGService.snapshot_path()}"
+        )
     print("--- INGESTÃO CONCLUÍDA ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
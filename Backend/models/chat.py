@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
 from sqlalchemy.orm import relationship
 from extensions import db
 
@@ -12,6 +12,12 @@ class Chat(db.Model):
     name = Column(String(100), nullable=False)
     created_at = Column(DateTime, server_default=db.func.now())
 
+    # Resumo das mensagens antigas que já saíram da janela de histórico enviada à IA
+    history_summary = Column(Text, nullable=True)
+    # Cursores por tabela: ids da última mensagem do usuário / da IA já incorporada ao resumo
+    summary_user_message_id = Column(Integer, nullable=True)
+    summary_ai_message_id = Column(Integer, nullable=True)
+
     user = relationship("User", back_populates="chats")
     user_messages = relationship(
         "UserMessage", back_populates="chat", cascade="all, delete-orphan"
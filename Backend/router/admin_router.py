@@ -4,7 +4,15 @@ from models.user import User
 from DAO.user_dao import UserDAO
 from DAO.message_user_dao import UserMessageDAO
 from middleware.jwt_util import token_required, admin_required
-from services.ai_service import analyze_user_risk_profile
+from services.ai_service import analyze_user_risk_profile, answer_cache, model_catalog
+from services.result_cache import result_cache
+from services.rag_service import RAGService
+from services.prompt_templates import persona_cache
+from services.llm_clients import llm_clients
+from services.llm_async import llm_orchestrator
+from services.provider_router import provider_router
+from services.chat_history import history_stats
+from services.rate_limiter import rate_limiter
 from datetime import datetime, timedelta
 from sqlalchemy import or_
 
@@ -189,4 +197,46 @@ def resolve_appeal(user_id):
         return jsonify({"error": "Ação inválida."}), 400
         
     db.session.commit()
-    return jsonify({"message": msg})
\ No newline at end of file
+    return jsonify({"message": msg})
+
+# --- MÉTRICAS DE DESEMPENHO ---
+
+@admin_bp.route("/metrics", methods=["GET"])
+@token_required
+@admin_required
+def get_metrics():
+    """Contadores dos caches e pools internos deste worker."""
+    return jsonify({
+        "rag_cache": RAGService.cache_stats(),
+        "persona_prompt": persona_cache.stats(),
+        "llm_clients": llm_clients.stats(),
+        "answer_cache": answer_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "llm_async": llm_orchestrator.stats(),
+        "providers": provider_router.stats(),
+        "chat_history": history_stats.as_dict(),
+        "model_catalog": model_catalog.stats(),
+        "rate_limiter": rate_limiter.stats(),
+    })
+
+
+@admin_bp.route("/answer-cache", methods=["DELETE"])
+@token_required
+@admin_required
+def purge_answer_cache():
+    """Limpa o cache semântico de respostas (de um modelo com ?model=, ou todo)."""
+    model = request.args.get("model")
+    removed = answer_cache.purge(model)
+    return jsonify({"message": "Cache de respostas limpo.", "removed": removed, "model": model})
+
+
+@admin_bp.route("/model-catalog/refresh", methods=["POST"])
+@token_required
+@admin_required
+def refresh_model_catalog():
+    """Consulta agora a lista de modelos dos provedores e atualiza o cache e o snapshot em disco."""
+    try:
+        models = model_catalog.refresh()
+    except Exception as e:
+        return jsonify({"error": "Falha ao atualizar o catálogo de modelos.", "details": str(e)}), 502
+    return jsonify({"message": "Catálogo de modelos atualizado.", "models": models})
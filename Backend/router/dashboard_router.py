@@ -2,9 +2,14 @@ from flask import Blueprint, jsonify, request
 from DAO.chat_dao import ChatDAO
 from DAO.message_user_dao import UserMessageDAO
 from services.ai_service import generate_dashboard_insight, analyze_user_doubts
+from services.llm_async import LLMTask, llm_orchestrator
 from middleware.jwt_util import token_required
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
+import os
+
+# Tempo máximo de cada chamada de IA do dashboard (dúvidas e insight rodam em paralelo)
+DASHBOARD_LLM_TIMEOUT = float(os.getenv("LLM_DASHBOARD_TIMEOUT", "12"))
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
 
@@ -115,12 +120,23 @@ def get_dashboard_stats():
                 break
 
     # --- 4. OUTROS ---
+    # Dúvidas e insight são chamadas de IA independentes: rodam em paralelo
     user_msgs_text = [m.content for m in sorted_msgs]
-    top_doubts = (
-        analyze_user_doubts(user_msgs_text[:15])
-        if user_msgs_text
-        else ["Nenhuma dúvida registrada."]
-    )
+    last_msg_content = sorted_msgs[0].content if sorted_msgs else ""
+    llm_tasks = {}
+    if user_msgs_text:
+        llm_tasks["doubts"] = LLMTask(
+            analyze_user_doubts, user_msgs_text[:15],
+            timeout=DASHBOARD_LLM_TIMEOUT, default=["Erro na análise."],
+        )
+    if last_msg_content:
+        llm_tasks["insight"] = LLMTask(
+            generate_dashboard_insight, user.name, last_msg_content,
+            timeout=DASHBOARD_LLM_TIMEOUT, default=None,
+        )
+    llm_results = llm_orchestrator.run_all(llm_tasks)
+
+    top_doubts = llm_results.get("doubts", ["Nenhuma dúvida registrada."])
 
     sorted_chats = sorted(chats, key=lambda c: c.created_at, reverse=True)[:10]
     history_data = [
@@ -133,14 +149,9 @@ def get_dashboard_stats():
         for c in sorted_chats
     ]
 
-    last_msg_content = sorted_msgs[0].content if sorted_msgs else ""
     ai_insight = {"type": "neutral", "text": "Inicie uma conversa para receber dicas."}
-    if last_msg_content:
-        try:
-            insight_text = generate_dashboard_insight(user.name, last_msg_content)
-            ai_insight = {"type": "success", "text": insight_text}
-        except:
-            pass
+    if llm_results.get("insight"):
+        ai_insight = {"type": "success", "text": llm_results["insight"]}
 
     return jsonify(
         {
@@ -0,0 +1,25 @@
+from flask import Blueprint, jsonify
+from services.rag_service import RAGService
+import os
+
+health_bp = Blueprint("health", __name__, url_prefix="/health")
+
+RAG_WARMUP = os.getenv("RAG_WARMUP", "false").lower() in ("1", "true", "yes")
+
+
+@health_bp.route("/live", methods=["GET"])
+def live():
+    """O processo está de pé (não verifica dependências)."""
+    return jsonify({"status": "ok"}), 200
+
+
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """
+    Prontidão para o balanceador de carga.
+    Com RAG_WARMUP ativo, responde 503 até o RAG estar aquecido neste worker.
+    """
+    rag = RAGService.readiness()
+    if RAG_WARMUP and rag["status"] != "ready":
+        return jsonify({"status": "warming", "rag": rag}), 503
+    return jsonify({"status": "ready", "rag": rag}), 200
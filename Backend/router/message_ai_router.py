@@ -4,11 +4,15 @@ from DAO.message_user_dao import UserMessageDAO
 from DAO.chat_dao import ChatDAO
 from datetime import datetime
 from middleware.jwt_util import token_required
+from services.rag_service import RAGService
+from services.llm_async import LLMTask, llm_orchestrator
+from services.chat_history import build_history, schedule_fold
 from services.ai_service import (
     generate_response,
     generate_response_stream,
     generate_chat_title,
-    get_available_models
+    model_catalog,
+    STREAM_ERROR_PREFIX,
 )
 
 from dotenv import load_dotenv
@@ -20,6 +24,8 @@ load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_TOKEN = os.getenv("OPENAI_TOKEN")
+# Tempo máximo da geração do título, que roda em paralelo com a resposta principal
+TITLE_TIMEOUT = float(os.getenv("LLM_TITLE_TIMEOUT", "15"))
 
 logger = logging.getLogger(__name__)
 
@@ -35,23 +41,28 @@ def get_api_key_for_model(model_name):
     return OPENAI_TOKEN
 
 
-def check_and_update_title(chat_id, user_content, history):
+def start_title_generation(user_content, history):
     """
-    Se o histórico estiver vazio (primeira mensagem), gera um título
-    com IA e atualiza o chat.
+    Se o histórico estiver vazio (primeira mensagem), dispara a geração do título
+    em paralelo com a resposta principal. Retorna o Future (ou None).
     """
-    print("* check_and_update_title called")
-    if not history:
-        try:
-            print("* Generating new title for chat")
-            if user_content and isinstance(user_content, str):
-                new_title = generate_chat_title(user_content)
-                ChatDAO.update_chat(chat_id, {"name": new_title})
-                logger.info(f"Chat {chat_id} renomeado para: {new_title}")
-                print(f"* Chat {chat_id} renamed to: {new_title}")
-        except Exception as e:
-            logger.error(f"Falha ao renomear chat: {e}")
-            print(f"* Failed to rename chat: {e}")
+    if history or not user_content or not isinstance(user_content, str):
+        return None
+    return llm_orchestrator.submit(
+        LLMTask(generate_chat_title, user_content, timeout=TITLE_TIMEOUT, default=None)
+    )
+
+
+def apply_generated_title(chat_id, title_future):
+    """Aguarda o título disparado por start_title_generation e atualiza o chat."""
+    new_title = llm_orchestrator.result(title_future)
+    if not new_title:
+        return
+    try:
+        ChatDAO.update_chat(chat_id, {"name": new_title})
+        logger.info(f"Chat {chat_id} renomeado para: {new_title}")
+    except Exception as e:
+        logger.error(f"Falha ao renomear chat: {e}")
 
 
 @message_ai_bp.route("/send", methods=["POST"])
@@ -83,9 +94,10 @@ def send_message():
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
 
-    history = ChatDAO.get_messages_formated(chat_id, limit=15) or []
+    history = build_history(chat_id)
 
-    check_and_update_title(chat_id, content, history)
+    # Título e resposta rodam ao mesmo tempo: a latência é a da mais lenta
+    title_future = start_title_generation(content, history)
 
     user_msg = UserMessageDAO.create_message(
         user_id=user_id_primitive,
@@ -103,8 +115,11 @@ def send_message():
         )
     except Exception as e:
         logger.exception("AI generation failed")
+        apply_generated_title(chat_id, title_future)
         return jsonify({"error": "AI generation failed", "details": str(e)}), 500
 
+    apply_generated_title(chat_id, title_future)
+
     if not ai_text:
         return jsonify({"error": "Empty response from AI"}), 500
 
@@ -114,6 +129,8 @@ def send_message():
         created_at=datetime.utcnow(),
         model=model,
     )
+    # Resumo das mensagens antigas atualizado em segundo plano, fora do tempo de resposta
+    schedule_fold(current_app._get_current_object(), chat_id)
 
     return (
         jsonify({"user_message": user_msg.to_dict(), "ai_message": ai_msg.to_dict()}),
@@ -151,9 +168,15 @@ def send_stream():
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
 
-    history = ChatDAO.get_messages_formated(chat_id) or []
+    # A busca RAG roda em paralelo com a leitura do histórico e a gravação da
+    # mensagem; o stream só espera por ela antes de chamar o modelo.
+    safe_content = content.replace("<user_input>", "").replace("</user_input>", "")
+    rag_future = RAGService.search_context_async(safe_content)
 
-    check_and_update_title(chat_id, content, history)
+    history = build_history(chat_id)
+
+    # O título é gerado em paralelo e gravado ao fim do stream (não atrasa o primeiro token)
+    title_future = start_title_generation(content, history)
 
     UserMessageDAO.create_message(
         user_id=user_id_primitive, chat_id=chat_id, content=content
@@ -171,10 +194,16 @@ def send_stream():
                     api_key=api_key,
                     model=model,
                     prompt=content,
+                    retrieved_context=rag_future,
                 ):
                     if chunk is None:
                         continue
                     chunk_str = str(chunk)
+                    if chunk_str.startswith(STREAM_ERROR_PREFIX):
+                        # Erro vai ao cliente como evento de erro e não é gravado como resposta da IA
+                        err_payload = json.dumps({"error": chunk_str[len(STREAM_ERROR_PREFIX):]}, ensure_ascii=False)
+                        yield f"event: chunk\ndata: {err_payload}\n\n"
+                        break
                     full_response += chunk_str
 
                     payload = json.dumps({"token": chunk_str}, ensure_ascii=False)
@@ -182,13 +211,7 @@ def send_stream():
 
             except Exception as e:
                 logger.exception("Error while streaming to client")
-                err_msg = str(e)
-                if "429" in err_msg:
-                    err_msg = (
-                        "Limite de requisições excedido. Tente novamente em instantes."
-                    )
-
-                err_payload = json.dumps({"error": err_msg})
+                err_payload = json.dumps({"error": str(e)})
                 yield f"event: chunk\ndata: {err_payload}\n\n"
 
             if full_response.strip():
@@ -202,6 +225,9 @@ def send_stream():
                 except Exception as db_err:
                     logger.error(f"Failed to save AI message: {db_err}")
 
+            apply_generated_title(chat_id, title_future)
+            schedule_fold(app, chat_id)
+
             yield f"event: end\ndata: [DONE]\n\n"
 
     return Response(event_stream(), mimetype="text/event-stream")
@@ -236,15 +262,15 @@ def create_ai_message():
     target_user = UserDAO.get_user_by_id(target_user_id)
     target_user_name = target_user.name if target_user else "Usuário"
 
-    history = ChatDAO.get_messages_formated(chat_id) or []
-
-    check_and_update_title(chat_id, prompt, history)
+    history = build_history(chat_id)
 
     try:
         api_key = get_api_key_for_model(model)
     except ValueError as e:
         return jsonify({"error": str(e)}), 500
 
+    title_future = start_title_generation(prompt, history)
+
     try:
         ai_text = generate_response(
             user_name=target_user_name,
@@ -254,14 +280,18 @@ def create_ai_message():
             prompt=prompt,
         )
     except Exception as e:
+        apply_generated_title(chat_id, title_future)
         return jsonify({"error": "AI generation error", "detail": str(e)}), 500
 
+    apply_generated_title(chat_id, title_future)
+
     if not ai_text:
         return jsonify({"error": "AI response generation failed"}), 500
 
     message_ai = AIMessageDAO.create_message(
         chat_id=chat_id, content=ai_text, created_at=datetime.utcnow(), model=model
     )
+    schedule_fold(current_app._get_current_object(), chat_id)
 
     return jsonify(message_ai.to_dict()), 201
 
@@ -359,6 +389,10 @@ def delete_ai_message(message_id):
 
 @message_ai_bp.route("/available_models", methods=["GET"])
 def available_models():
-    available_models = get_available_models(api_key=GEMINI_API_KEY, openai_token=OPENAI_TOKEN)
-    
+    try:
+        available_models = model_catalog.get()
+    except Exception as e:
+        logger.error(f"Catálogo de modelos indisponível: {e}")
+        return jsonify({"error": "Model catalogue unavailable"}), 503
+
     return jsonify({"models":available_models})
\ No newline at end of file
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from services.cache_service import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Cache semântico de respostas para primeiras perguntas (sem histórico). Desligado por padrão.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+# Similaridade de cosseno mínima para considerar duas perguntas equivalentes
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Respostas guardadas por modelo (as menos usadas saem primeiro)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+class _Namespace:
+    """Respostas de um modelo: LRU por pergunta normalizada + matriz de embeddings para a busca"""
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+
+    def changed(self):
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            self._keys = [k for k, e in self.entries.items() if e["embedding"] is not None]
+            self._matrix = (
+                np.vstack([self.entries[k]["embedding"] for k in self._keys])
+                if self._keys else np.zeros((0, 0), dtype=np.float32)
+            )
+        return self._matrix, self._keys
+
+
+class SemanticAnswerCache:
+    """
+    Serve uma resposta já gerada quando a nova pergunta é (quase) igual a uma anterior
+    do mesmo modelo: primeiro por igualdade da pergunta normalizada, depois por
+    similaridade de embedding acima do limiar. Um namespace por modelo, com TTL e LRU.
+    O cache é local ao processo (cada worker mantém o seu).
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], object],
+        enabled: bool = ANSWER_CACHE_ENABLED,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.embed = embed
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _embedding(self, normalized: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(self.embed(normalized), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Cache de respostas sem embedding (só igualdade exata): {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _drop_expired(self, namespace: _Namespace, now: float):
+        expired = [k for k, e in namespace.entries.items() if e["expires_at"] < now]
+        for key in expired:
+            del namespace.entries[key]
+        if expired:
+            self.expirations += len(expired)
+            namespace.changed()
+
+    def lookup(self, model: str, question: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        normalized = normalize_query(question)
+        now = time.monotonic()
+        with self._lock:
+            namespace = self._namespaces.get(model)
+            if namespace is not None:
+                self._drop_expired(namespace, now)
+                entry = namespace.entries.get(normalized)
+                if entry is not None:
+                    namespace.entries.move_to_end(normalized)
+                    self.exact_hits += 1
+                    return entry["answer"]
+            if namespace is None or not namespace.entries:
+                self.misses += 1
+                return None
+
+        # Embedding fora do lock (pode levar alguns ms)
+        embedding = self._embedding(normalized)
+        with self._lock:
+            namespace = self._namespaces.get(model)
+            if embedding is not None and namespace is not None:
+                matrix, keys = namespace.matrix()
+                if len(keys) and matrix.shape[1] == embedding.shape[0]:
+                    similarities = matrix @ embedding
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold and keys[best] in namespace.entries:
+                        namespace.entries.move_to_end(keys[best])
+                        self.semantic_hits += 1
+                        return namespace.entries[keys[best]]["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, model: str, question: str, answer: str):
+        if not self.enabled or not answer:
+            return
+        normalized = normalize_query(question)
+        embedding = self._embedding(normalized)
+        with self._lock:
+            namespace = self._namespaces.setdefault(model, _Namespace())
+            namespace.entries[normalized] = {
+                "answer": answer,
+                "embedding": embedding,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            namespace.entries.move_to_end(normalized)
+            while len(namespace.entries) > self.max_entries:
+                namespace.entries.popitem(last=False)
+                self.evictions += 1
+            namespace.changed()
+            self.stores += 1
+
+    def purge(self, model: Optional[str] = None) -> int:
+        """Apaga as respostas de um modelo (ou de todos). Retorna quantas foram removidas."""
+        with self._lock:
+            if model is None:
+                removed = sum(len(ns.entries) for ns in self._namespaces.values())
+                self._namespaces.clear()
+            else:
+                namespace = self._namespaces.pop(model, None)
+                removed = len(namespace.entries) if namespace else 0
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = {model: len(ns.entries) for model, ns in self._namespaces.items()}
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "max_entries_per_model": self.max_entries,
+            "models": sizes,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
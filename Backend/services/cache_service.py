@@ -0,0 +1,103 @@
+import threading
+import time
+import unicodedata
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza a pergunta para uso como chave de cache (caixa, espaços e pontuação final)"""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+class LRUCache:
+    """Cache LRU thread-safe com limite de itens e contadores de acerto/erro"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear_prefix(self, prefix: str) -> int:
+        """Remove os itens cuja chave (como texto) começa com o prefixo. Retorna quantos saíram."""
+        with self._lock:
+            keys = [k for k in self._data if str(k).startswith(prefix)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class TTLCache(LRUCache):
+    """LRU em que cada item expira após 'ttl' segundos"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        super().__init__(max_size)
+        self.ttl = ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] < time.monotonic():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        super().set(key, (expires_at, value))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["ttl"] = self.ttl
+        return stats
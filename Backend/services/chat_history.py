@@ -0,0 +1,187 @@
+import os
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from DAO.chat_dao import ChatDAO
+from services.ai_service import summarize_conversation
+from services.llm_async import LLMTask, llm_orchestrator
+from services.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Orçamento (tokens cl100k_base) do histórico enviado ao modelo, sem contar o resumo
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# Teto fixo de mensagens no histórico, valendo mesmo se o resumo falhar
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+# Ao estourar o orçamento, as mensagens mais antigas vão para o resumo até sobrar esta fração
+# (folga para as próximas mensagens: o resumo não precisa ser refeito a cada turno)
+HISTORY_KEEP_RATIO = float(os.getenv("HISTORY_KEEP_RATIO", "0.6"))
+# Teto de uma mensagem isolada no histórico (ex: contrato colado inteiro no chat)
+HISTORY_MESSAGE_MAX_TOKENS = int(os.getenv("HISTORY_MESSAGE_MAX_TOKENS", "1200"))
+# Teto do resumo persistido
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "600"))
+# Tempo máximo da atualização do resumo em segundo plano
+HISTORY_FOLD_TIMEOUT = float(os.getenv("HISTORY_FOLD_TIMEOUT", "60"))
+
+SUMMARY_PREFIX = "[Resumo da conversa anterior]"
+
+
+class HistoryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.dropped_messages = 0
+        self.folds = 0
+        self.folded_messages = 0
+        self.fold_failures = 0
+        self.truncated_messages = 0
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        return {
+            "token_budget": HISTORY_TOKEN_BUDGET,
+            "max_messages": HISTORY_MAX_MESSAGES,
+            "keep_ratio": HISTORY_KEEP_RATIO,
+            "message_max_tokens": HISTORY_MESSAGE_MAX_TOKENS,
+            "builds": self.builds,
+            "dropped_messages": self.dropped_messages,
+            "folds": self.folds,
+            "folded_messages": self.folded_messages,
+            "fold_failures": self.fold_failures,
+            "truncated_messages": self.truncated_messages,
+            "pending_folds": len(_pending),
+        }
+
+
+history_stats = HistoryStats()
+
+# Chats cujo histórico passou do limite e que ainda esperam o resumo (fold_history)
+_pending: set = set()
+_pending_lock = threading.Lock()
+_folding: set = set()
+
+
+def _load_messages(chat) -> Tuple[List[Dict], List[int], int]:
+    """
+    Mensagens posteriores ao resumo, cada uma cortada no teto por mensagem (só na cópia
+    enviada ao modelo), os tokens de cada uma e quantas foram cortadas.
+    """
+    messages = ChatDAO.get_messages_after(chat.id, chat.summary_user_message_id, chat.summary_ai_message_id)
+    tokens, truncated = [], 0
+    for message in messages:
+        count = count_tokens(message["content"] or "")
+        if count > HISTORY_MESSAGE_MAX_TOKENS:
+            message["content"] = truncate_tokens(message["content"], HISTORY_MESSAGE_MAX_TOKENS) + " [...]"
+            count = HISTORY_MESSAGE_MAX_TOKENS
+            truncated += 1
+        tokens.append(count)
+    return messages, tokens, truncated
+
+
+def build_history(chat_id, token_budget: int = HISTORY_TOKEN_BUDGET) -> List[Dict]:
+    """
+    Histórico do chat limitado por tokens e por HISTORY_MAX_MESSAGES, no formato [{"role", "content"}].
+    Entram as mensagens posteriores ao resumo persistido do chat, das mais recentes para as
+    mais antigas, até o limite. Não chama a IA: as que ficaram de fora são incorporadas ao
+    resumo em segundo plano, depois da resposta (schedule_fold).
+    O resumo, quando existe, vai como mensagem "system" (contexto, não fala do usuário).
+    """
+    chat = ChatDAO.get_chat_by_id(chat_id)
+    if not chat:
+        return []
+
+    messages, tokens, truncated = _load_messages(chat)
+    keep, total = 0, 0
+    while keep < min(len(messages), HISTORY_MAX_MESSAGES) and (
+        keep == 0 or total + tokens[-keep - 1] <= token_budget
+    ):
+        total += tokens[-keep - 1]
+        keep += 1
+
+    dropped = len(messages) - keep
+    history_stats.add(
+        builds=1,
+        dropped_messages=dropped,
+        truncated_messages=truncated,
+    )
+    if dropped:
+        with _pending_lock:
+            _pending.add(chat_id)
+
+    history = [{"role": m["role"], "content": m["content"]} for m in messages[len(messages) - keep:]]
+    if chat.history_summary:
+        history.insert(0, {"role": "system", "content": f"{SUMMARY_PREFIX}\n{chat.history_summary}"})
+    return history
+
+
+def fold_history(chat_id, token_budget: int = HISTORY_TOKEN_BUDGET) -> bool:
+    """
+    Incorpora ao resumo do chat as mensagens mais antigas (atualização incremental, só com as
+    mensagens novas) até sobrar HISTORY_KEEP_RATIO do orçamento e das mensagens.
+    Retorna True se o resumo foi atualizado.
+    """
+    chat = ChatDAO.get_chat_by_id(chat_id)
+    if not chat:
+        return False
+
+    messages, tokens, _ = _load_messages(chat)
+    total = sum(tokens)
+    if total <= token_budget and len(messages) <= HISTORY_MAX_MESSAGES:
+        return False
+
+    target_tokens = int(token_budget * HISTORY_KEEP_RATIO)
+    target_messages = max(1, int(HISTORY_MAX_MESSAGES * HISTORY_KEEP_RATIO))
+    cut = 0
+    while cut < len(messages) - 1 and (total > target_tokens or len(messages) - cut > target_messages):
+        total -= tokens[cut]
+        cut += 1
+
+    folded = messages[:cut]
+    new_summary = summarize_conversation(chat.history_summary, folded)
+    if not new_summary:
+        # As antigas continuam fora do histórico (limite fixo); o próximo fold tenta de novo
+        history_stats.add(fold_failures=1)
+        return False
+
+    user_ids = [m["id"] for m in folded if m["role"] == "user"]
+    ai_ids = [m["id"] for m in folded if m["role"] != "user"]
+    ChatDAO.update_history_summary(
+        chat_id,
+        truncate_tokens(new_summary, HISTORY_SUMMARY_MAX_TOKENS),
+        max(user_ids, default=chat.summary_user_message_id),
+        max(ai_ids, default=chat.summary_ai_message_id),
+    )
+    history_stats.add(folds=1, folded_messages=len(folded))
+    return True
+
+
+def schedule_fold(app, chat_id) -> Optional[Future]:
+    """
+    Chamado pelas rotas depois de gravar a resposta: se o último build_history deixou mensagens
+    de fora, atualiza o resumo em segundo plano. Um fold por chat de cada vez.
+    """
+    with _pending_lock:
+        if chat_id not in _pending or chat_id in _folding:
+            return None
+        _pending.discard(chat_id)
+        _folding.add(chat_id)
+
+    def fold_chat_history():
+        try:
+            with app.app_context():
+                return fold_history(chat_id)
+        except Exception as e:
+            logger.error(f"Falha ao atualizar o resumo do chat {chat_id}: {e}")
+            history_stats.add(fold_failures=1)
+            return False
+        finally:
+            with _pending_lock:
+                _folding.discard(chat_id)
+
+    return llm_orchestrator.submit(LLMTask(fold_chat_history, timeout=HISTORY_FOLD_TIMEOUT, default=False))
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+import logging
+from typing import Dict, List, Tuple
+
+from services.legal_sources import find_law_mentions, strip_accents
+
+logger = logging.getLogger(__name__)
+
+# Índice (norma, artigo) -> ids dos chunks, persistido ao lado do banco vetorial
+CITATION_INDEX_PATH = os.path.join(os.path.dirname(__file__), "../data/citation_index.json")
+
+# Distância máxima (em caracteres) entre "art. X" e o nome da norma que o acompanha
+_MAX_LAW_GAP = 60
+
+# Um número de dispositivo ("477", "1.228", "7º", "7-A") e listas deles ("186 e 187", "5, 6 e 7")
+_NUMBER = r"\d{1,4}(?:\.\d{3})*\s*[ºo°]?(?:\s*-\s*[a-z]\b)?"
+_NUMBER_LIST = rf"{_NUMBER}(?:\s*(?:,|\be\b)\s*{_NUMBER})*"
+_NUMBER_RE = re.compile(r"(\d{1,4}(?:\.\d{3})*)\s*[ºo°]?(?:\s*-\s*([a-z])\b)?")
+
+_ARTICLE_CITE_RE = re.compile(rf"\bart(?:igo)?s?\.?\s*({_NUMBER_LIST})")
+_SUMULA_CITE_RE = re.compile(
+    rf"\bsumulas?\s+(vinculantes?\s+)?(?:n\.?\s*[ºo°]?\s*)?({_NUMBER_LIST})"
+)
+# Tribunais que editam súmulas. Só as do TST estão indexadas (data/laws_txt/sumulas_tst.txt)
+_COURT_RE = re.compile(
+    r"\b(tst|stf|stj|tribunal superior do trabalho|supremo tribunal federal|superior tribunal de justica)\b"
+)
+_COURTS = {
+    "tst": "TST",
+    "tribunal superior do trabalho": "TST",
+    "stf": "STF",
+    "supremo tribunal federal": "STF",
+    "stj": "STJ",
+    "superior tribunal de justica": "STJ",
+}
+
+
+def citation_key(law: str, article: str) -> str:
+    return f"{law}|{article}"
+
+
+def _numbers(number_list: str) -> List[str]:
+    """'186 e 187' -> ['186', '187']; '7º-a' -> ['7-A']"""
+    labels = []
+    for match in _NUMBER_RE.finditer(number_list):
+        number = match.group(1).replace(".", "")
+        labels.append(f"{number}-{match.group(2).upper()}" if match.group(2) else number)
+    return labels
+
+
+def _nearby(mentions: List[Tuple[int, int, str]], start: int, end: int):
+    """Menção logo após o trecho ("art. 477 da CLT") ou, senão, logo antes ("CLT, art. 477")"""
+    following = [m for m in mentions if 0 <= m[0] - end <= _MAX_LAW_GAP]
+    preceding = [m for m in mentions if 0 <= start - m[1] <= _MAX_LAW_GAP]
+    return following[0] if following else (preceding[-1] if preceding else None)
+
+
+def parse_citations(text: str) -> Tuple[List[Tuple[str, str]], str]:
+    """
+    Extrai citações explícitas como "art. 477 da CLT", "arts. 186 e 187 do Código Civil"
+    ou "Súmula 331 do TST".
+    Retorna ([(norma, artigo)], restante do texto sem as citações).
+    Artigos sem norma identificável ficam no restante, para a busca semântica, assim como
+    súmulas vinculantes ou de outro tribunal (STF/STJ), que não estão indexadas.
+    """
+    text = unicodedata.normalize("NFC", text)
+    lowered = strip_accents(text.lower())
+    laws = find_law_mentions(lowered)
+    citations: List[Tuple[str, str]] = []
+    spans: List[Tuple[int, int]] = []
+
+    for match in _ARTICLE_CITE_RE.finditer(lowered):
+        law_mention = _nearby(laws, match.start(), match.end())
+        if not law_mention:
+            continue
+
+        citations.extend((law_mention[2], article) for article in _numbers(match.group(1)))
+        spans.append((match.start(), match.end()))
+        spans.append((law_mention[0], law_mention[1]))
+
+    courts = [(m.start(), m.end(), _COURTS[re.sub(r"\s+", " ", m.group(1))]) for m in _COURT_RE.finditer(lowered)]
+    for match in _SUMULA_CITE_RE.finditer(lowered):
+        court_mention = _nearby(courts, match.start(), match.end())
+        # Súmula do TST: com o TST por perto ou sem nenhum outro tribunal na pergunta
+        is_tst = court_mention[2] == "TST" if court_mention else all(c[2] == "TST" for c in courts)
+        if match.group(1) or not is_tst:
+            continue
+
+        citations.extend(("TST", f"Súmula {number}") for number in _numbers(match.group(2)))
+        spans.append((match.start(), match.end()))
+        if court_mention:
+            spans.append((court_mention[0], court_mention[1]))
+
+    # Remove os trechos citados preservando o resto da pergunta
+    remainder = []
+    cursor = 0
+    for start, end in sorted(set(spans)):
+        if start >= cursor:
+            remainder.append(text[cursor:start])
+            cursor = end
+        else:
+            cursor = max(cursor, end)
+    remainder.append(text[cursor:])
+
+    unique_citations = list(dict.fromkeys(citations))
+    return unique_citations, re.sub(r"\s+", " ", " ".join(remainder)).strip()
+
+
+class CitationIndex:
+    """Mapa pré-computado na ingestão: (norma, artigo) -> ids dos chunks daquele dispositivo"""
+
+    def __init__(self, path: str = CITATION_INDEX_PATH):
+        self.path = path
+        self.entries: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = CITATION_INDEX_PATH) -> "CitationIndex":
+        index = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    index.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Índice de citações inválido, ignorando: {e}")
+        return index
+
+    def save(self):
+        with self._lock:
+            payload = {"entries": self.entries}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def upsert(self, ids: List[str], metadatas: List[dict]):
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                law, article = metadata.get("law"), metadata.get("article")
+                if not law or not article:
+                    continue
+                doc_ids = self.entries.setdefault(citation_key(law, article), [])
+                if doc_id not in doc_ids:
+                    doc_ids.append(doc_id)
+                    # Mantém as partes do artigo em ordem (..._0, ..._1, ..._10)
+                    doc_ids.sort(key=lambda i: int(i.rsplit("_", 1)[-1]) if i.rsplit("_", 1)[-1].isdigit() else 0)
+
+    def delete(self, ids: List[str]):
+        removed = set(ids)
+        with self._lock:
+            for key in list(self.entries):
+                remaining = [doc_id for doc_id in self.entries[key] if doc_id not in removed]
+                if remaining:
+                    self.entries[key] = remaining
+                else:
+                    del self.entries[key]
+
+    def lookup(self, law: str, article: str) -> List[str]:
+        return self.entries.get(citation_key(law, article), [])
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,116 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+from services.tokens import count_tokens
+
+# Orçamento de tokens do contexto RAG injetado no prompt do sistema
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1200"))
+# Fração dos trigramas de palavras de um trecho já presente em outro a partir da qual ele é duplicado
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("RAG_NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Cabeçalho que o chunker coloca nos chunks de continuação ("Art. 477 (cont.)")
+_CONTINUATION_RE = re.compile(r"^(?:Art\.|S[úu]mula)[^\n]*\(cont\.\)\n")
+_WORD_RE = re.compile(r"\w+")
+# Sobreposições menores que isso são coincidência (pontuação, uma palavra), não overlap do chunker
+_MIN_OVERLAP_CHARS = 20
+
+
+def _strip_continuation(text: str) -> str:
+    return _CONTINUATION_RE.sub("", text, count=1)
+
+
+def _join_overlapping(previous: str, following: str) -> str:
+    """Concatena dois chunks consecutivos removendo o trecho repetido pela sobreposição"""
+    following = _strip_continuation(following)
+    max_overlap = min(len(previous), len(following), 2000)
+    for size in range(max_overlap, _MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return previous + following[size:]
+    return f"{previous}\n{following}"
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _coverage(candidate: set, selected: set) -> float:
+    """Quanto do candidato já está coberto por um trecho selecionado (pega também trechos contidos)"""
+    if not candidate or not selected:
+        return 0.0
+    return len(candidate & selected) / len(candidate)
+
+
+def _unit_key(hit: Dict) -> tuple:
+    """
+    Dispositivo do chunk: o id sem o sufixo da parte. Não basta (fonte, artigo): rótulos
+    repetidos no mesmo arquivo (ex: Art. 1 do ADCT depois do Art. 1 da CF) têm ids distintos.
+    """
+    meta = hit.get("metadata") or {}
+    suffix = f"_{meta.get('part', 0)}"
+    if meta.get("article") and hit["id"].endswith(suffix):
+        return ("unit", hit["id"][: -len(suffix)])
+    return ("__id__", hit["id"])
+
+
+def _merge_adjacent(hits: List[Dict]) -> List[Dict]:
+    """
+    Junta chunks do mesmo artigo com partes consecutivas (ou repetidas) em um único
+    trecho. O trecho resultante herda a melhor posição de relevância do grupo.
+    """
+    groups: Dict[tuple, List[tuple]] = {}
+    for rank, hit in enumerate(hits):
+        groups.setdefault(_unit_key(hit), []).append((rank, hit))
+
+    merged = []
+    for members in groups.values():
+        members.sort(key=lambda m: (m[1].get("metadata") or {}).get("part", 0))
+        run_rank, run_hit, run_text, last_part = None, None, "", None
+        for rank, hit in members:
+            part = (hit.get("metadata") or {}).get("part", 0)
+            if run_hit is not None and part == last_part:
+                continue
+            if run_hit is not None and part == last_part + 1:
+                run_text = _join_overlapping(run_text, hit["text"])
+                run_rank = min(run_rank, rank)
+            else:
+                if run_hit is not None:
+                    merged.append((run_rank, {**run_hit, "text": run_text}))
+                run_rank, run_hit, run_text = rank, hit, hit["text"]
+            last_part = part
+        if run_hit is not None:
+            merged.append((run_rank, {**run_hit, "text": run_text}))
+
+    merged.sort(key=lambda m: m[0])
+    return [hit for _, hit in merged]
+
+
+def pack_context(hits: List[Dict], token_budget: Optional[int] = None) -> List[Dict]:
+    """
+    Prepara os trechos recuperados para o prompt:
+    1. junta chunks adjacentes/sobrepostos do mesmo artigo;
+    2. descarta quase-duplicatas;
+    3. preenche o orçamento de tokens em ordem de relevância (o que não cabe fica de fora).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+
+    packed: List[Dict] = []
+    packed_shingles: List[set] = []
+    used = 0
+    for hit in _merge_adjacent(hits):
+        shingles = _shingles(hit["text"])
+        if any(_coverage(shingles, other) >= NEAR_DUPLICATE_THRESHOLD for other in packed_shingles):
+            continue
+
+        source = (hit.get("metadata") or {}).get("source", "")
+        tokens = count_tokens(hit["text"]) + count_tokens(f"--- FONTE: {source} ---")
+        if used + tokens > budget:
+            continue
+
+        packed.append(hit)
+        packed_shingles.append(shingles)
+        used += tokens
+    return packed
@@ -0,0 +1,166 @@
+import os
+import re
+import logging
+from typing import Callable, Dict, List, Optional
+
+from services.cache_service import normalize_query
+from services.llm_async import LLMTask, llm_orchestrator
+
+logger = logging.getLogger(__name__)
+
+# Acima deste tamanho o contrato é analisado em trechos (map-reduce) em vez de uma chamada só
+CONTRACT_SINGLE_PASS_CHARS = int(os.getenv("CONTRACT_SINGLE_PASS_CHARS", "30000"))
+# Tamanho alvo de cada trecho (caracteres)
+CONTRACT_CHUNK_CHARS = int(os.getenv("CONTRACT_CHUNK_CHARS", "12000"))
+# Trechos analisados ao mesmo tempo por contrato
+CONTRACT_MAP_CONCURRENCY = int(os.getenv("CONTRACT_MAP_CONCURRENCY", "4"))
+CONTRACT_CHUNK_TIMEOUT = float(os.getenv("CONTRACT_CHUNK_TIMEOUT", "90"))
+# Peso da pior cláusula no score final (o resto é a média ponderada pelo tamanho dos trechos)
+CONTRACT_RISK_MAX_WEIGHT = float(os.getenv("CONTRACT_RISK_MAX_WEIGHT", "0.7"))
+# Teto de destaques no resultado final
+CONTRACT_MAX_HIGHLIGHTS = int(os.getenv("CONTRACT_MAX_HIGHLIGHTS", "25"))
+
+# Início de cláusula: "CLÁUSULA PRIMEIRA", "Cláusula 3ª", "3.", "3.1", "Art. 5º", "§ 2º", "Parágrafo único"
+CLAUSE_RE = re.compile(
+    r"^\s*(?:CL[ÁA]USULA\b|Cl[áa]usula\b|\d{1,3}(?:\.\d{1,3})*\.?\s+[A-ZÀ-Ú]|Art\.?\s*\d|§\s*\d|Par[áa]grafo\s+[úu]nico)",
+)
+RISK_LABELS = [(30, "Baixo"), (60, "Médio"), (85, "Alto"), (101, "Crítico")]
+
+
+def _split_oversized(text: str, max_chars: int) -> List[str]:
+    """Cláusula maior que o trecho: corta por parágrafo e, em último caso, por tamanho"""
+    parts, current = [], ""
+    for paragraph in re.split(r"(\n\s*\n)", text):
+        if len(current) + len(paragraph) <= max_chars:
+            current += paragraph
+            continue
+        if current.strip():
+            parts.append(current)
+        while len(paragraph) > max_chars:
+            parts.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        current = paragraph
+    if current.strip():
+        parts.append(current)
+    return parts
+
+
+def split_clauses(text: str, max_chars: int = CONTRACT_CHUNK_CHARS) -> List[str]:
+    """Agrupa cláusulas consecutivas em trechos de até max_chars, sem cortar cláusulas no meio"""
+    clauses, current = [], []
+    for line in text.splitlines(keepends=True):
+        if CLAUSE_RE.match(line) and current:
+            clauses.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        clauses.append("".join(current))
+
+    chunks, buffer = [], ""
+    for clause in clauses:
+        if len(clause) > max_chars:
+            if buffer.strip():
+                chunks.append(buffer)
+            buffer = ""
+            chunks.extend(_split_oversized(clause, max_chars))
+        elif len(buffer) + len(clause) > max_chars:
+            chunks.append(buffer)
+            buffer = clause
+        else:
+            buffer += clause
+    if buffer.strip():
+        chunks.append(buffer)
+    return chunks
+
+
+def risk_label(score: int) -> str:
+    return next(label for limit, label in RISK_LABELS if score < limit)
+
+
+def combine_risk(results: List[Dict], weights: List[int]) -> Dict:
+    """
+    O risco de um contrato é dominado pela pior cláusula: o score final mistura o maior
+    score dos trechos com a média ponderada pelo tamanho de cada um.
+    """
+    scored = []
+    for result, weight in zip(results, weights):
+        try:
+            scored.append((max(0, min(100, int(result.get("risk", {}).get("score", 0)))), weight))
+        except (TypeError, ValueError):
+            continue
+    if not scored:
+        return {"score": 0, "label": risk_label(0)}
+    worst = max(score for score, _ in scored)
+    mean = sum(score * weight for score, weight in scored) / (sum(weight for _, weight in scored) or 1)
+    score = round(CONTRACT_RISK_MAX_WEIGHT * worst + (1 - CONTRACT_RISK_MAX_WEIGHT) * mean)
+    return {"score": score, "label": risk_label(score)}
+
+
+def merge_highlights(results: List[Dict], limit: int = CONTRACT_MAX_HIGHLIGHTS) -> List[Dict]:
+    """
+    Junta os destaques na ordem do documento, descartando repetidos: mesmo trecho citado
+    (normalizado) ou trecho contido em outro já escolhido com a mesma tag.
+    """
+    merged: List[Dict] = []
+    keys: List[tuple] = []
+    for result in results:
+        for highlight in result.get("highlights") or []:
+            if not isinstance(highlight, dict):
+                continue
+            tag = normalize_query(str(highlight.get("tag", "")))
+            snippet = normalize_query(str(highlight.get("snippet", "")))
+            if not snippet:
+                continue
+            duplicate = None
+            for index, (kept_tag, kept_snippet) in enumerate(keys):
+                if snippet == kept_snippet or (tag == kept_tag and (snippet in kept_snippet or kept_snippet in snippet)):
+                    duplicate = index
+                    break
+            if duplicate is None:
+                merged.append(highlight)
+                keys.append((tag, snippet))
+            elif len(snippet) > len(keys[duplicate][1]):
+                # Fica a versão mais completa do trecho
+                merged[duplicate] = highlight
+                keys[duplicate] = (tag, snippet)
+    return merged[:limit]
+
+
+def analyze_long_contract(
+    text: str,
+    analyze_chunk: Callable[[str, int, int], Dict],
+    summarize: Callable[[List[str]], Optional[str]],
+) -> Optional[Dict]:
+    """
+    Map-reduce: cada trecho é analisado em paralelo (até CONTRACT_MAP_CONCURRENCY por vez),
+    depois os destaques são unidos sem repetição, os scores combinados e os resumos dos
+    trechos condensados em um só. Retorna None se nenhum trecho pôde ser analisado.
+    """
+    chunks = split_clauses(text)
+    total = len(chunks)
+    outputs = llm_orchestrator.run_all(
+        {
+            str(i): LLMTask(analyze_chunk, chunk, i + 1, total, timeout=CONTRACT_CHUNK_TIMEOUT, default=None)
+            for i, chunk in enumerate(chunks)
+        },
+        concurrency=CONTRACT_MAP_CONCURRENCY,
+    )
+    analyzed = [
+        (outputs.get(str(i)), len(chunk))
+        for i, chunk in enumerate(chunks)
+        if isinstance(outputs.get(str(i)), dict)
+    ]
+    logger.info(f"Contrato de {len(text)} caracteres: {len(analyzed)}/{total} trechos analisados")
+    if not analyzed:
+        return None
+
+    results = [result for result, _ in analyzed]
+    summaries = [str(r.get("summary", "")).strip() for r in results if r.get("summary")]
+    summary = summarize(summaries) or " ".join(summaries)[:300]
+    if len(analyzed) < total:
+        summary += f" (Atenção: {total - len(analyzed)} de {total} trechos não puderam ser analisados.)"
+    return {
+        "summary": summary,
+        "risk": combine_risk(results, [weight for _, weight in analyzed]),
+        "highlights": merge_highlights(results),
+    }
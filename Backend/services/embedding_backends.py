@@ -0,0 +1,194 @@
+import os
+import logging
+from functools import cached_property
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from chromadb.utils import embedding_functions
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+logger = logging.getLogger(__name__)
+
+# Backend de embedding usado pelo RAG: "default" (MiniLM fp32 do Chroma) ou "onnx-int8"
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "default").lower()
+# Threads do ONNX Runtime por processo e tamanho do lote de inferência
+EMBEDDING_THREADS = int(os.getenv("RAG_EMBEDDING_THREADS", "0"))  # 0 = decisão do ONNX Runtime
+EMBEDDING_BATCH_SIZE = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "32"))
+# Pasta com model.onnx e tokenizer.json do all-MiniLM-L6-v2 (padrão: cache do Chroma)
+ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR", "")
+
+_BASE_MODEL_FILES = ("model.onnx", "tokenizer.json")
+
+
+class QuantizedMiniLMEmbeddingFunction(ONNXMiniLM_L6_V2):
+    """
+    Mesmo modelo all-MiniLM-L6-v2 do Chroma, com pesos quantizados em int8.
+    Diferenças em relação ao default:
+    - modelo quantizado dinamicamente (gerado uma vez a partir do model.onnx do Chroma, baixado
+      e conferido antes da quantização);
+    - padding até o maior texto do lote (o default sempre preenche até 256 tokens);
+    - tokenização em lote e nº de threads configurável.
+    """
+
+    QUANTIZED_FILENAME = "model_int8.onnx"
+
+    def __init__(self, threads: Optional[int] = None, batch_size: Optional[int] = None):
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+        self.threads = EMBEDDING_THREADS if threads is None else threads
+        self.batch_size = batch_size or EMBEDDING_BATCH_SIZE
+
+    @staticmethod
+    def name() -> str:
+        return "onnx_mini_lm_l6_v2_int8"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"threads": self.threads, "batch_size": self.batch_size}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "QuantizedMiniLMEmbeddingFunction":
+        return QuantizedMiniLMEmbeddingFunction(
+            threads=config.get("threads"), batch_size=config.get("batch_size")
+        )
+
+    @staticmethod
+    def validate_config(config: Dict[str, Any]) -> None:
+        return None
+
+    def _model_folder(self) -> str:
+        if ONNX_MODEL_DIR:
+            return ONNX_MODEL_DIR
+        download_path = getattr(self, "DOWNLOAD_PATH", None)
+        if download_path is None:
+            raise ValueError(
+                "Versão do chromadb sem o cache do all-MiniLM-L6-v2; defina RAG_ONNX_MODEL_DIR "
+                "com a pasta que contém model.onnx e tokenizer.json."
+            )
+        return os.path.join(download_path, getattr(self, "EXTRACTED_FOLDER_NAME", "onnx"))
+
+    def _ensure_base_model(self) -> str:
+        """
+        Garante que o modelo fp32 e o tokenizer estão no disco (baixando pelo Chroma se
+        preciso) e retorna a pasta. Falha com uma mensagem clara se não estiverem.
+        """
+        folder = self._model_folder()
+        missing = [f for f in _BASE_MODEL_FILES if not os.path.isfile(os.path.join(folder, f))]
+        if missing and not ONNX_MODEL_DIR:
+            download = getattr(self, "_download_model_if_not_exists", None)
+            if download is not None:
+                try:
+                    download()
+                except Exception as e:
+                    raise ValueError(f"Falha ao baixar o modelo all-MiniLM-L6-v2 para {folder}: {e}") from e
+            missing = [f for f in _BASE_MODEL_FILES if not os.path.isfile(os.path.join(folder, f))]
+        if missing:
+            raise ValueError(
+                f"Modelo all-MiniLM-L6-v2 incompleto em {folder} (faltando: {', '.join(missing)}). "
+                "Baixe-o (ex: rodando o backend 'default' uma vez com internet) ou defina RAG_ONNX_MODEL_DIR."
+            )
+        return folder
+
+    def _quantized_model_path(self) -> str:
+        folder = self._ensure_base_model()
+        quantized_path = os.path.join(folder, self.QUANTIZED_FILENAME)
+        if not os.path.exists(quantized_path):
+            try:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+            except ImportError as e:
+                raise ValueError(
+                    "Quantização requer o pacote 'onnx'. Instale com `pip install onnx`."
+                ) from e
+            logger.info("Gerando modelo de embedding quantizado (int8)...")
+            tmp_path = f"{quantized_path}.tmp"
+            try:
+                quantize_dynamic(
+                    model_input=os.path.join(folder, "model.onnx"),
+                    model_output=tmp_path,
+                    weight_type=QuantType.QInt8,
+                )
+            except Exception as e:
+                raise ValueError(f"Falha ao quantizar {os.path.join(folder, 'model.onnx')}: {e}") from e
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    @cached_property
+    def model(self) -> Any:
+        so = self.ort.SessionOptions()
+        so.log_severity_level = 3
+        so.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            so.intra_op_num_threads = self.threads
+            so.inter_op_num_threads = 1
+        return self.ort.InferenceSession(
+            self._quantized_model_path(),
+            providers=["CPUExecutionProvider"],
+            sess_options=so,
+        )
+
+    @cached_property
+    def tokenizer(self) -> Any:
+        tokenizer = self.Tokenizer.from_file(os.path.join(self._ensure_base_model(), "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_tokens())
+        # Sem 'length': preenche só até o maior texto do lote
+        tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        return tokenizer
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        # Confere/baixa o modelo antes de carregar a sessão, com erro claro se faltar algo
+        self._ensure_base_model()
+        return [np.array(embedding, dtype=np.float32) for embedding in self._forward(input)]
+
+    def _forward(self, documents: List[str]) -> np.ndarray:
+        all_embeddings = []
+        for i in range(0, len(documents), self.batch_size):
+            encoded = self.tokenizer.encode_batch(documents[i:i + self.batch_size])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+
+            last_hidden_state = self.model.run(None, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            })[0]
+
+            # Mean pooling ponderado pela máscara de atenção
+            mask = attention_mask[..., np.newaxis].astype(np.float32)
+            embeddings = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            all_embeddings.append(self._normalize(embeddings).astype(np.float32))
+
+        return np.concatenate(all_embeddings)
+
+
+# Registra no Chroma para que a configuração da coleção possa ser reconstruída
+if hasattr(embedding_functions, "register_embedding_function"):
+    try:
+        embedding_functions.register_embedding_function(QuantizedMiniLMEmbeddingFunction)
+    except ValueError:
+        pass
+
+
+EMBEDDING_BACKENDS: Dict[str, Callable[[], Any]] = {
+    "default": embedding_functions.DefaultEmbeddingFunction,
+    "onnx-int8": QuantizedMiniLMEmbeddingFunction,
+}
+
+
+def register_embedding_backend(name: str, factory: Callable[[], Any]):
+    """Permite adicionar outros backends (ex: API do Google) sem alterar o RAGService"""
+    EMBEDDING_BACKENDS[name.lower()] = factory
+
+
+def get_embedding_function(backend: Optional[str] = None):
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    factory = EMBEDDING_BACKENDS.get(backend)
+    if factory is None:
+        raise ValueError(f"Backend de embedding desconhecido: {backend}")
+    return factory()
+
+
+def collection_suffix(backend: Optional[str] = None) -> str:
+    """
+    Cada backend gera vetores em um espaço próprio, então usa sua própria coleção.
+    O default mantém o nome original (legislacao_brasileira).
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    return "" if backend == "default" else f"_{backend}"
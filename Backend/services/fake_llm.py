@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+# Provedor falso para testes de carga sem chave de API (LLM_PROVIDER=fake).
+# Respostas determinísticas (mesmo modelo + mesma entrada = mesmo texto) e tempos configuráveis:
+# latência fixa + tempo até o primeiro token + tokens/s.
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "50"))
+FAKE_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "250"))
+FAKE_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "60"))
+FAKE_RESPONSE_TOKENS = int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "80"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_SEED = int(os.getenv("FAKE_LLM_SEED", "42"))
+
+FAKE_MODELS = ["gemini-2.5-flash", "gemini-2.5-flash-lite", "gpt-4o-mini"]
+
+_VOCABULARY = (
+    "conforme o artigo da lei o empregado tem direito ao aviso prévio e às verbas rescisórias "
+    "no prazo legal cabe ao consumidor exigir a reparação do dano e o fornecedor responde "
+    "pelos vícios do produto recomenda-se consultar um advogado para analisar o caso concreto "
+    "a jurisprudência do tribunal entende que o contrato deve observar a boa-fé objetiva"
+).split()
+
+# Sequência de erros reproduzível entre execuções (mesma semente, mesma ordem de chamadas)
+_error_rng = random.Random(FAKE_SEED)
+_error_lock = threading.Lock()
+
+
+class FakeProviderError(Exception):
+    """Erro simulado; imita o 429 dos provedores reais"""
+
+    status_code = 429
+
+
+def _maybe_fail():
+    if FAKE_ERROR_RATE <= 0:
+        return
+    with _error_lock:
+        failed = _error_rng.random() < FAKE_ERROR_RATE
+    if failed:
+        raise FakeProviderError("429 Resource exhausted (erro simulado pelo provedor falso)")
+
+
+def _tokens(model: str, prompt: str, count: Optional[int] = None) -> List[str]:
+    seed = int(hashlib.sha256(f"{model}|{prompt}".encode("utf-8")).hexdigest()[:16], 16)
+    rng = random.Random(seed)
+    return [rng.choice(_VOCABULARY) for _ in range(count or FAKE_RESPONSE_TOKENS)]
+
+
+def fake_text(model: str, prompt: str) -> str:
+    return " ".join(_tokens(model, prompt)).capitalize() + "."
+
+
+def fake_json(model: str, prompt: str) -> str:
+    """JSON com as chaves que os fluxos de JSON do ai_service leem (contrato, dúvidas, risco)"""
+    words = _tokens(model, prompt, 24)
+    score = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:4], 16) % 101
+    label = "Baixo" if score < 30 else "Médio" if score < 60 else "Alto" if score < 85 else "Crítico"
+    return json.dumps({
+        "summary": " ".join(words[:12]).capitalize() + ".",
+        "risk": {"score": score, "label": label},
+        "highlights": [{"tag": "Prazo", "snippet": " ".join(words[12:18]), "explanation": " ".join(words[18:])}],
+        "doubts": [" ".join(words[i:i + 4]).capitalize() for i in range(0, 12, 4)],
+        "score": score,
+    }, ensure_ascii=False)
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def _generate(model: str, prompt: str, as_json: bool) -> str:
+    """Resposta completa: latência + TTFT + tempo de gerar todos os tokens"""
+    _sleep_ms(FAKE_LATENCY_MS)
+    _maybe_fail()
+    _sleep_ms(FAKE_TTFT_MS)
+    text = fake_json(model, prompt) if as_json else fake_text(model, prompt)
+    if FAKE_TOKENS_PER_SECOND > 0:
+        time.sleep(FAKE_RESPONSE_TOKENS / FAKE_TOKENS_PER_SECOND)
+    return text
+
+
+def _stream(model: str, prompt: str) -> Iterator[str]:
+    _sleep_ms(FAKE_LATENCY_MS)
+    _maybe_fail()
+    _sleep_ms(FAKE_TTFT_MS)
+    interval = 1 / FAKE_TOKENS_PER_SECOND if FAKE_TOKENS_PER_SECOND > 0 else 0
+    for i, token in enumerate(_tokens(model, prompt)):
+        if i and interval:
+            time.sleep(interval)
+        yield token if i == 0 else f" {token}"
+
+
+# --- Interface do google.generativeai ---
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str, generation_config: Optional[Dict] = None, **kwargs):
+        self.model_name = model_name
+        self._as_json = (generation_config or {}).get("response_mime_type") == "application/json"
+
+    def generate_content(self, prompt, stream: bool = False, request_options: Optional[Dict] = None):
+        prompt = str(prompt)
+        if stream:
+            return (SimpleNamespace(text=t) for t in _stream(self.model_name, prompt))
+        return SimpleNamespace(text=_generate(self.model_name, prompt, self._as_json))
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self)
+
+
+class FakeChatSession:
+    def __init__(self, model: FakeGenerativeModel):
+        self.model = model
+
+    def send_message(self, content, stream: bool = False, request_options: Optional[Dict] = None):
+        return self.model.generate_content(content, stream=stream)
+
+
+def fake_gemini_models() -> List[SimpleNamespace]:
+    """Mesmo formato de genai.list_models()"""
+    return [
+        SimpleNamespace(name=f"models/{m}", supported_generation_methods=["generateContent", "countTokens"])
+        for m in FAKE_MODELS
+        if m.startswith("gemini")
+    ]
+
+
+# --- Interface do cliente OpenAI ---
+
+class _FakeCompletions:
+    def create(self, model: str, messages: List[Dict], response_format: Optional[Dict] = None, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        as_json = (response_format or {}).get("type") == "json_object"
+        content = _generate(model, prompt, as_json)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_FakeCompletions())
+        self.models = SimpleNamespace(
+            list=lambda: SimpleNamespace(data=[SimpleNamespace(id=m) for m in FAKE_MODELS if m.startswith("gpt-")])
+        )
+
+
+# --- Streaming "cru" (SSE) da OpenAI ---
+
+class FakeStreamResponse:
+    def __init__(self, model: str, prompt: str):
+        self._tokens = _stream(model, prompt)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        return None
+
+    def iter_lines(self, decode_unicode: bool = False):
+        for token in self._tokens:
+            payload = json.dumps({"choices": [{"delta": {"content": token}}]}, ensure_ascii=False)
+            yield f"data: {payload}".encode("utf-8")
+            yield b""
+        yield b"data: [DONE]"
+
+
+class FakeStreamSession:
+    def post(self, url: str, json: Optional[Dict] = None, **kwargs) -> FakeStreamResponse:
+        body = json or {}
+        messages = body.get("messages") or [{}]
+        return FakeStreamResponse(body.get("model", ""), messages[-1].get("content", ""))
+
+    def stats(self) -> dict:
+        return {"provider": "fake"}
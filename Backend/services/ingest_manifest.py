@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Manifesto persistido ao lado do banco vetorial
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "../data/ingest_manifest.json")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """
+    Registro dos hashes de cada arquivo e de cada chunk já indexados.
+    Permite que a ingestão processe apenas o que mudou desde a última execução.
+
+    Formato:
+    {
+        "files": {
+            "clt.txt": {"hash": "...", "chunks": {"clt.txt_0": "...", ...}}
+        }
+    }
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, path: str = MANIFEST_PATH) -> "IngestManifest":
+        manifest = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    manifest.files = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                # Manifesto corrompido equivale a reindexar tudo
+                logger.warning(f"Manifesto de ingestão inválido, ignorando: {e}")
+        return manifest
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=2)
+        # Troca atômica para não deixar um manifesto pela metade
+        os.replace(tmp_path, self.path)
+
+    def file_unchanged(self, source_name: str, file_hash: str) -> bool:
+        entry = self.files.get(source_name)
+        return bool(entry) and entry.get("hash") == file_hash
+
+    def diff_chunks(
+        self, source_name: str, chunk_hashes: Dict[str, str]
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Compara os chunks atuais com os registrados.
+        Retorna (ids novos ou alterados, ids que deixaram de existir).
+        """
+        previous = self.files.get(source_name, {}).get("chunks", {})
+        changed = [cid for cid, h in chunk_hashes.items() if previous.get(cid) != h]
+        removed = [cid for cid in previous if cid not in chunk_hashes]
+        return changed, removed
+
+    def update_file(self, source_name: str, file_hash: str, chunk_hashes: Dict[str, str]):
+        self.files[source_name] = {"hash": file_hash, "chunks": dict(chunk_hashes)}
+
+    def remove_file(self, source_name: str) -> List[str]:
+        """Remove o arquivo do manifesto e retorna os ids de chunk que ele possuía"""
+        entry = self.files.pop(source_name, None) or {}
+        return list(entry.get("chunks", {}).keys())
+
+    def sources(self) -> List[str]:
+        return list(self.files.keys())
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.cache_service import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Arquivo do armazenamento local compartilhado entre os workers da mesma máquina
+KV_STORE_PATH = os.getenv(
+    "KV_STORE_PATH", os.path.join(os.path.dirname(__file__), "../data/kv_store.sqlite3")
+)
+MEMORY_STORE_SIZE = int(os.getenv("KV_MEMORY_STORE_SIZE", "4096"))
+
+
+class MemoryStore:
+    """Chave-valor com TTL dentro do processo (cada worker tem o seu)"""
+
+    name = "memory"
+
+    def __init__(self, max_size: int = MEMORY_STORE_SIZE):
+        self._cache = TTLCache(max_size=max_size, ttl=0)
+        self._update_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: str, ttl: float):
+        self._cache.set(key, value, ttl=ttl)
+
+    def update(self, key: str, fn: Callable[[Optional[str]], Tuple[str, Any]], ttl: float) -> Any:
+        """Leitura-modificação-escrita atômica: fn(valor atual) -> (novo valor, retorno)"""
+        with self._update_lock:
+            value, result = fn(self._cache.get(key))
+            self._cache.set(key, value, ttl=ttl)
+        return result
+
+    def delete(self, key: str):
+        self._cache.delete(key)
+
+    def clear(self, prefix: str = ""):
+        self._cache.clear_prefix(prefix)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self._cache.stats()}
+
+
+class SQLiteStore:
+    """
+    Substituto local de um Redis: chave-valor com TTL em um arquivo SQLite (modo WAL),
+    visível para todos os workers da máquina sem depender de um servidor externo.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = KV_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)
+        )
+        # Limpeza preguiçosa dos expirados (barata graças ao índice)
+        conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+
+    def update(self, key: str, fn: Callable[[Optional[str]], Tuple[str, Any]], ttl: float) -> Any:
+        """
+        Leitura-modificação-escrita atômica entre threads e processos: fn(valor atual) -> (novo valor, retorno).
+        BEGIN IMMEDIATE trava a escrita do arquivo durante a transação (curta: uma linha).
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            value, result = fn(row[0] if row else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def clear(self, prefix: str = ""):
+        self._connect().execute(
+            "DELETE FROM kv WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        size = self._connect().execute("SELECT COUNT(*) FROM kv WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+        return {
+            "backend": self.name,
+            "path": os.path.abspath(self.path),
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+KV_STORE_BACKENDS: Dict[str, Callable[[], Any]] = {
+    "memory": MemoryStore,
+    "sqlite": SQLiteStore,
+}
+
+
+def register_store_backend(name: str, factory: Callable[[], Any]):
+    """Permite plugar outro armazenamento (ex: um Redis de verdade) com a mesma interface"""
+    KV_STORE_BACKENDS[name.lower()] = factory
+
+
+def get_store(backend: str):
+    factory = KV_STORE_BACKENDS.get(backend.lower())
+    if factory is None:
+        raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+    return factory()
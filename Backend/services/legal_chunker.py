@@ -0,0 +1,176 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+from services.legal_sources import law_for_source
+from services.tokens import count_tokens, get_encoder, tokenizer_name
+
+# Limites padrão de cada chunk (em tokens do tokenizer cl100k_base)
+CHUNK_MAX_TOKENS = int(os.getenv("RAG_CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "32"))
+
+# Versão do formato dos chunks (texto/ids/metadados). Incrementar força o re-chunk na próxima ingestão
+CHUNKER_VERSION = 3
+
+# Fronteiras estruturais de textos legais
+ARTICLE_RE = re.compile(r"^\s*Art\.?\s*(\d{1,3}(?:\.\d{3})*)\s*[º°o]?(?:\s*-\s*([A-Z])\b)?", re.IGNORECASE)
+SUMULA_RE = re.compile(r"^\s*S[úu]mula\s+(?:Vinculante\s+)?(?:n\.?\s*[º°o]?\s*)?(\d+)", re.IGNORECASE)
+PARAGRAPH_RE = re.compile(r"^\s*(§\s*\d+|Par[áa]grafo\s+[úu]nico)", re.IGNORECASE)
+INCISO_RE = re.compile(r"^\s*[IVXLCDM]+\s*[-–—]\s")
+ALINEA_RE = re.compile(r"^\s*[a-z]\)\s")
+
+
+def parse_article_label(line: str) -> Optional[str]:
+    """Retorna o rótulo normalizado ('477', '1228', '7-A', 'Súmula 331') se a linha abre um dispositivo"""
+    match = ARTICLE_RE.match(line)
+    if match:
+        number = match.group(1).replace(".", "")
+        return f"{number}-{match.group(2).upper()}" if match.group(2) else number
+    match = SUMULA_RE.match(line)
+    if match:
+        return f"Súmula {match.group(1)}"
+    return None
+
+
+def _is_subunit_start(line: str) -> bool:
+    return bool(PARAGRAPH_RE.match(line) or INCISO_RE.match(line) or ALINEA_RE.match(line))
+
+
+def _split_units(text: str) -> List[Dict]:
+    """
+    Divide o texto em dispositivos (artigos / súmulas), cada um com suas partes
+    (caput, parágrafos, incisos, alíneas). O que vem antes do primeiro dispositivo
+    é devolvido como preâmbulo (label None).
+    """
+    units = [{"label": None, "parts": []}]
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        label = parse_article_label(line)
+        if label:
+            units.append({"label": label, "parts": [line]})
+        elif _is_subunit_start(line) or not units[-1]["parts"]:
+            units[-1]["parts"].append(line)
+        else:
+            # Continuação de linha quebrada: junta à parte anterior
+            units[-1]["parts"][-1] += " " + line
+    return [u for u in units if u["parts"]]
+
+
+def _split_by_tokens(text: str, max_tokens: int, overlap: int) -> List[str]:
+    """Corta um texto único maior que o limite em janelas de tokens com sobreposição"""
+    encoder = get_encoder()
+    tokens = encoder.encode(text)
+    step = max(1, max_tokens - overlap)
+    windows = []
+    for start in range(0, len(tokens), step):
+        windows.append(encoder.decode(tokens[start:start + max_tokens]))
+        if start + max_tokens >= len(tokens):
+            break
+    return windows
+
+
+def _pack_parts(parts: List[str], max_tokens: int, overlap: int, heading: str) -> List[str]:
+    """
+    Agrupa as partes de um dispositivo em chunks de até max_tokens.
+    Chunks de continuação recebem o cabeçalho do artigo e repetem as últimas
+    partes do chunk anterior até somar 'overlap' tokens.
+    """
+    whole = "\n".join(parts)
+    if count_tokens(whole) <= max_tokens:
+        return [whole]
+
+    prefix = [heading] if heading else []
+    heading_tokens = count_tokens(heading) + 1 if heading else 0
+    chunks: List[str] = []
+    current: List[str] = []
+    # Inclui o cabeçalho quando ele já está em current
+    current_tokens = 0
+
+    def has_body() -> bool:
+        return len(current) > (len(prefix) if chunks else 0)
+
+    for part in parts:
+        part_tokens = count_tokens(part)
+
+        # Só a primeira parte do primeiro chunk dispensa o cabeçalho
+        if part_tokens > max_tokens - (heading_tokens if chunks or current else 0):
+            if has_body():
+                chunks.append("\n".join(current))
+            for window in _split_by_tokens(part, max(1, max_tokens - heading_tokens), overlap):
+                chunks.append("\n".join(prefix + [window]) if chunks else window)
+            # O chunk seguinte continua o mesmo artigo: começa com o cabeçalho
+            current, current_tokens = list(prefix), heading_tokens
+            continue
+
+        if has_body() and current_tokens + part_tokens > max_tokens:
+            chunks.append("\n".join(current))
+            # Sobreposição: reaproveita as últimas partes que cabem no overlap (junto com a parte nova)
+            carried, carried_tokens = [], 0
+            for prev in reversed(current):
+                prev_tokens = count_tokens(prev)
+                if (
+                    prev == heading
+                    or carried_tokens + prev_tokens > overlap
+                    or heading_tokens + carried_tokens + prev_tokens + part_tokens > max_tokens
+                ):
+                    break
+                carried.insert(0, prev)
+                carried_tokens += prev_tokens
+            current = prefix + carried
+            current_tokens = heading_tokens + carried_tokens
+
+        current.append(part)
+        current_tokens += part_tokens
+
+    if has_body():
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def chunk_legal_text(
+    text: str,
+    source_name: str,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Quebra um texto legal respeitando Art., §, incisos e Súmulas.
+    Retorna [{"id", "text", "metadata"}] com ids estáveis por artigo, de modo que
+    editar um artigo só altera os chunks daquele artigo.
+    """
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    overlap = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    overlap = min(overlap, max_tokens // 2)
+
+    units = _split_units(text)
+    has_articles = any(u["label"] for u in units)
+
+    law = law_for_source(source_name)
+    chunks: List[Dict] = []
+    seen_labels: Dict[str, int] = {}
+
+    for unit in units:
+        label = unit["label"]
+        if label is None and has_articles:
+            # Preâmbulo ("FONTE: ...") não é indexado sozinho
+            continue
+
+        key = label or "texto"
+        occurrence = seen_labels.get(key, 0)
+        seen_labels[key] = occurrence + 1
+        # Artigos repetidos no mesmo arquivo (ex: ADCT) recebem sufixo
+        id_base = f"{source_name}_{key.replace(' ', '_')}" + (f"_{occurrence}" if occurrence else "")
+
+        if label is None:
+            heading = ""
+        elif label.startswith("Súmula"):
+            heading = f"{label} (cont.)"
+        else:
+            heading = f"Art. {label} (cont.)"
+        for part_idx, chunk_text in enumerate(_pack_parts(unit["parts"], max_tokens, overlap, heading)):
+            metadata = {"source": source_name, "law": law, "article": label or "", "part": part_idx}
+            chunks.append({"id": f"{id_base}_{part_idx}", "text": chunk_text, "metadata": metadata})
+
+    return chunks
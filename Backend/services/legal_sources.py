@@ -0,0 +1,72 @@
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Catálogo das normas conhecidas: código -> nomes/apelidos usados pelos usuários.
+# Os apelidos são comparados sem acento e em minúsculas.
+LAW_ALIASES: Dict[str, List[str]] = {
+    "CLT": ["clt", "consolidacao das leis do trabalho"],
+    "CF": ["cf", "cf/88", "cf 88", "constituicao federal", "constituicao"],
+    "CDC": ["cdc", "codigo de defesa do consumidor"],
+    "CC": ["codigo civil", "cc", "cc/2002"],
+    "CP": ["codigo penal", "cp"],
+    "LMP": ["lei maria da penha", "maria da penha", "lei 11.340", "lei n 11.340", "lei 11340"],
+    "TST": ["tst", "tribunal superior do trabalho"],
+}
+
+# Arquivo em data/laws_txt -> código da norma
+SOURCE_LAWS: Dict[str, str] = {
+    "clt": "CLT",
+    "constituicao": "CF",
+    "cdc": "CDC",
+    "codigo_civil": "CC",
+    "codigo_penal": "CP",
+    "maria_da_penha": "LMP",
+    "sumulas_tst": "TST",
+}
+
+
+def strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def law_for_source(source_name: str) -> str:
+    """Código da norma a partir do nome do arquivo (ex: 'clt.txt' -> 'CLT')"""
+    stem = os.path.splitext(os.path.basename(source_name))[0].lower()
+    return SOURCE_LAWS.get(stem, stem.upper())
+
+
+# Apelidos mais longos primeiro para 'codigo civil' ganhar de 'cc' etc.
+_ALIAS_RE = re.compile(
+    r"(?<![\w/])("
+    + "|".join(
+        re.escape(alias).replace(r"\ ", r"\s+")
+        for alias in sorted({a for aliases in LAW_ALIASES.values() for a in aliases}, key=len, reverse=True)
+    )
+    + r")(?![\w/])"
+)
+_ALIAS_TO_LAW = {
+    re.sub(r"\s+", " ", alias): law for law, aliases in LAW_ALIASES.items() for alias in aliases
+}
+
+
+def find_law_mentions(text: str) -> List[Tuple[int, int, str]]:
+    """
+    Localiza menções a normas no texto já sem acentos e em minúsculas.
+    Retorna [(início, fim, código)].
+    """
+    mentions = []
+    for match in _ALIAS_RE.finditer(text):
+        alias = re.sub(r"\s+", " ", match.group(1))
+        law: Optional[str] = _ALIAS_TO_LAW.get(alias)
+        if law:
+            mentions.append((match.start(), match.end(), law))
+    return mentions
+
+
+def laws_in_text(text: str) -> List[str]:
+    """Códigos das normas mencionadas em um texto livre, na ordem em que aparecem"""
+    lowered = strip_accents(unicodedata.normalize("NFC", text).lower())
+    return list(dict.fromkeys(law for _, _, law in find_law_mentions(lowered)))
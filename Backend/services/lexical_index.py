@@ -0,0 +1,145 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+import logging
+from collections import Counter
+from typing import Collection, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Índice persistido ao lado do banco vetorial
+LEXICAL_INDEX_PATH = os.path.join(os.path.dirname(__file__), "../data/lexical_index.json")
+
+# Parâmetros clássicos do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Palavras muito frequentes em português que não ajudam a ranquear
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "em",
+    "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelas", "pelo",
+    "pelos", "por", "que", "se", "sem", "sua", "suas", "seu", "seus", "um", "uma",
+    "meu", "minha", "tenho", "qual", "quais", "quanto", "quando", "sobre", "isso",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sem acentos, separando letras e números (ex: 'Art. 477' -> ['art', '477'])"""
+    text = unicodedata.normalize("NFD", (text or "").lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 em memória sobre os mesmos chunks da coleção vetorial.
+    Guarda texto e metadados de cada chunk para responder sem consultar o Chroma.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self.docs: Dict[str, Dict] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    # --- Persistência ---
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH) -> "BM25Index":
+        index = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    docs = json.load(f).get("docs", {})
+                for doc_id, doc in docs.items():
+                    index._add(doc_id, doc["text"], doc.get("metadata", {}))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Índice lexical inválido, ignorando: {e}")
+        return index
+
+    def save(self):
+        with self._lock:
+            payload = {"docs": self.docs}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # --- Manutenção ---
+
+    def _add(self, doc_id: str, text: str, metadata: dict):
+        if doc_id in self.docs:
+            self._remove(doc_id)
+        term_freqs = Counter(tokenize(text))
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(term_freqs.values())
+        self.docs[doc_id] = {"text": text, "metadata": metadata}
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def _remove(self, doc_id: str):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in set(tokenize(doc["text"])):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._add(doc_id, text, metadata)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def __len__(self):
+        return len(self.docs)
+
+    # --- Busca ---
+
+    def search(
+        self, query: str, n_results: int = 3, laws: Optional[Collection[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Retorna [(doc_id, score)] ordenado pelo BM25, sem tocar no modelo de embedding.
+        Com `laws`, só considera chunks dessas normas (metadado 'law').
+        """
+        terms = tokenize(query)
+        with self._lock:
+            n_docs = len(self.docs)
+            if not terms or not n_docs:
+                return []
+            avg_length = self.total_length / n_docs
+            scores: Dict[str, float] = {}
+            for term in set(terms):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in posting.items():
+                    if laws is not None and self.docs[doc_id]["metadata"].get("law") not in laws:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        return self.docs.get(doc_id)
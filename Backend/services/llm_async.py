@@ -0,0 +1,179 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Threads que executam as chamadas bloqueantes dos SDKs (Gemini/OpenAI) por baixo do asyncio
+LLM_ASYNC_WORKERS = int(os.getenv("LLM_ASYNC_WORKERS", "16"))
+# Timeout padrão de uma chamada orquestrada (segundos)
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+
+# Prazo (time.monotonic) da chamada orquestrada em andamento no contexto atual
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_call_deadline", default=None)
+
+
+def call_timeout(default: Optional[float] = None) -> Optional[float]:
+    """
+    Timeout a repassar ao SDK: o que resta do prazo da chamada orquestrada atual (limitado
+    por `default`), ou `default` fora de uma chamada orquestrada.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    remaining = max(0.1, deadline - time.monotonic())
+    return min(remaining, default) if default is not None else remaining
+
+
+class LLMTask:
+    """Uma chamada independente: função + argumentos, timeout próprio e valor em caso de falha"""
+
+    def __init__(
+        self,
+        func: Callable,
+        *args,
+        timeout: Optional[float] = None,
+        default: Any = None,
+        **kwargs,
+    ):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = LLM_CALL_TIMEOUT if timeout is None else timeout
+        self.default = default
+
+    @property
+    def name(self) -> str:
+        return getattr(self.func, "__name__", "llm_call")
+
+
+class LLMOrchestrator:
+    """
+    API assíncrona para chamadas de LLM independentes.
+    Um event loop próprio roda em uma thread de fundo (as rotas do Flask são síncronas);
+    as chamadas dos SDKs, que são bloqueantes, vão para um pool de threads. Cada chamada tem
+    seu timeout; ao estourar, o default é devolvido na hora, então a latência de um grupo de
+    chamadas é a da mais lenta (limitada pelo timeout), não a soma.
+    A chamada bloqueante em si não pode ser interrompida pelo asyncio: o prazo é repassado
+    ao SDK como timeout da requisição (call_timeout), e é isso que libera a thread do pool.
+    """
+
+    def __init__(self, workers: int = LLM_ASYNC_WORKERS):
+        self.workers = workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.running = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.cancelled = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="llm-call")
+                    loop = asyncio.new_event_loop()
+                    loop.set_default_executor(self._executor)
+                    threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    async def run(self, task: LLMTask) -> Any:
+        """Executa uma chamada com timeout; erros, timeout e cancelamento viram task.default"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deadline = time.monotonic() + task.timeout
+
+        def invoke():
+            # Contexto novo por chamada: o prazo não vaza para a próxima task da mesma thread
+            def call():
+                _deadline.set(deadline)
+                return task.func(*task.args, **task.kwargs)
+
+            with self._lock:
+                self.running += 1
+            try:
+                return contextvars.Context().run(call)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        try:
+            result = await asyncio.wait_for(loop.run_in_executor(None, invoke), timeout=task.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            # A thread segue ocupada até o timeout do SDK encerrar a requisição
+            self.timeouts += 1
+            logger.warning("%s excedeu %.1fs; usando valor padrão", task.name, task.timeout)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"{task.name} falhou após {time.perf_counter() - started:.2f}s: {e}")
+        return task.default
+
+    async def gather(self, tasks: Dict[str, LLMTask], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Todas as chamadas em paralelo; com `concurrency`, no máximo N rodando ao mesmo tempo"""
+        if concurrency:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def bounded(task: LLMTask):
+                # O timeout de cada chamada só começa a contar quando ela ganha a vaga
+                async with semaphore:
+                    return await self.run(task)
+
+            runs = [bounded(task) for task in tasks.values()]
+        else:
+            runs = [self.run(task) for task in tasks.values()]
+        results = await asyncio.gather(*runs)
+        return dict(zip(tasks.keys(), results))
+
+    # --- Pontos de entrada síncronos (para as rotas) ---
+
+    def submit(self, task: LLMTask) -> Future:
+        """
+        Dispara a chamada e devolve um Future. future.cancel() só para de esperar por ela:
+        a requisição já enviada termina (ou estoura o timeout do SDK) em segundo plano.
+        """
+        return asyncio.run_coroutine_threadsafe(self.run(task), self._ensure_loop())
+
+    def run_all(self, tasks: Dict[str, LLMTask], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Roda as chamadas em paralelo e espera todas: {nome: resultado ou default}"""
+        if not tasks:
+            return {}
+        future = asyncio.run_coroutine_threadsafe(self.gather(tasks, concurrency), self._ensure_loop())
+        return future.result()
+
+    @staticmethod
+    def result(future: Optional[Future], default: Any = None, timeout: Optional[float] = None) -> Any:
+        """Resultado de um submit (default se ausente, cancelado ou não terminado a tempo)"""
+        if future is None:
+            return default
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            return default
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            # Threads do pool ocupadas agora (inclui chamadas que já estouraram o prazo)
+            "running": self.running,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+        }
+
+
+llm_orchestrator = LLMOrchestrator()
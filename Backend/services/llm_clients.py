@@ -0,0 +1,346 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from openai import OpenAI
+
+from services.llm_async import call_timeout
+from services.rate_limiter import RateLimitExceeded
+from services.fake_llm import FakeGenerativeModel, FakeOpenAI, FakeStreamSession, fake_gemini_models
+
+logger = logging.getLogger(__name__)
+
+# "live" chama as APIs reais; "fake" usa o provedor local determinístico (services/fake_llm.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "live").lower()
+
+# Conexões HTTP por cliente OpenAI (um cliente por chave de API)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("LLM_OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("LLM_OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("LLM_OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("LLM_OPENAI_TIMEOUT", "120"))
+# Canais (clientes gRPC/REST) do Gemini por chave, distribuídos em round-robin entre os modelos
+GEMINI_CLIENTS_PER_KEY = int(os.getenv("LLM_GEMINI_CLIENTS_PER_KEY", "2"))
+GEMINI_TRANSPORT = os.getenv("LLM_GEMINI_TRANSPORT") or None  # None = padrão da biblioteca (grpc)
+GEMINI_TIMEOUT = float(os.getenv("LLM_GEMINI_TIMEOUT", "120"))
+# Sessão HTTP do streaming "cru" da OpenAI (requests com stream=True)
+STREAM_POOL_SIZE = int(os.getenv("LLM_STREAM_POOL_SIZE", "10"))
+STREAM_RETRIES = int(os.getenv("LLM_STREAM_RETRIES", "2"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "60"))
+# Espera máxima (s) por uma conexão livre quando todas estão ocupadas com outros streams
+STREAM_POOL_TIMEOUT = float(os.getenv("LLM_STREAM_POOL_TIMEOUT", "5"))
+
+
+def _digest(value: Any) -> str:
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def request_timeout(provider: str) -> float:
+    """Timeout da requisição ao SDK: o padrão do provedor, encurtado pelo prazo da chamada orquestrada"""
+    return call_timeout(GEMINI_TIMEOUT if provider == "gemini" else OPENAI_TIMEOUT)
+
+
+def gemini_request_options() -> Dict[str, float]:
+    return {"timeout": request_timeout("gemini")}
+
+
+class StreamPoolExhausted(RateLimitExceeded):
+    """Todas as conexões de streaming ficaram ocupadas por mais de pool_timeout segundos"""
+
+    def __init__(self, pool_size: int, timeout: float):
+        Exception.__init__(
+            self, f"Pool de streaming esgotado: {pool_size} conexões em uso por mais de {timeout:.0f}s"
+        )
+        self.provider = "openai"
+        self.wait = timeout
+
+
+class PooledSession:
+    """
+    requests.Session compartilhada entre as threads, para reaproveitar conexões keep-alive
+    (DNS + TCP + TLS uma vez só por conexão).
+    - pool limitado: cada resposta ocupa uma vaga até ser fechada; sem vaga livre em
+      pool_timeout segundos, levanta StreamPoolExhausted em vez de esperar para sempre;
+    - retentativas só antes da resposta começar (falha de conexão ou 502/503/504), então
+      nenhum token já transmitido é repetido. 429 não é repetido aqui: o limitador de
+      requisições (services/rate_limiter.py) é quem decide quando tentar de novo;
+    - conexões paradas há mais de idle_timeout são descartadas antes da próxima requisição,
+      evitando reaproveitar sockets que o servidor já derrubou.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = STREAM_POOL_SIZE,
+        retries: int = STREAM_RETRIES,
+        idle_timeout: float = STREAM_IDLE_TIMEOUT,
+        pool_timeout: float = STREAM_POOL_TIMEOUT,
+    ):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.pool_timeout = pool_timeout
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._last_used = time.monotonic()
+        self.in_use = 0
+        self.exhausted = 0
+        self.idle_resets = 0
+        # Contadores dos pools já descartados (o PoolManager recria os pools do zero)
+        self._retired = {"connections": 0, "requests": 0}
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=None,  # inclui POST: só repete quando nada foi transmitido
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def _connection_pools(self):
+        pools = self.adapter.poolmanager.pools
+        return [pools[key] for key in pools.keys() if key in pools]
+
+    def reap_idle(self):
+        """
+        Descarta os pools (PoolManager.clear): as conexões ociosas são fechadas na hora e as
+        que estão em uso são fechadas quando o stream terminar, em vez de voltarem ao pool.
+        """
+        with self._lock:
+            for pool in self._connection_pools():
+                self._retired["connections"] += pool.num_connections
+                self._retired["requests"] += pool.num_requests
+            self.adapter.poolmanager.clear()
+            self.idle_resets += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """POST que ocupa uma vaga do pool até a resposta ser fechada (use com `with`)"""
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            with self._lock:
+                self.exhausted += 1
+            raise StreamPoolExhausted(self.pool_size, self.pool_timeout)
+        now = time.monotonic()
+        with self._lock:
+            self.in_use += 1
+            idle_for = now - self._last_used
+            self._last_used = now
+            reap = idle_for > self.idle_timeout
+        try:
+            if reap:
+                self.reap_idle()
+            response = self.session.post(url, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+        close = response.close
+        released = threading.Event()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released.is_set():
+                    released.set()
+                    self._release()
+
+        response.close = close_and_release
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = self._connection_pools()
+            connections = self._retired["connections"] + sum(p.num_connections for p in pools)
+            requests_sent = self._retired["requests"] + sum(p.num_requests for p in pools)
+            in_use = self.in_use
+        return {
+            "pool_size": self.pool_size,
+            "pool_timeout": self.pool_timeout,
+            "in_use": in_use,
+            "exhausted": self.exhausted,
+            "requests": requests_sent,
+            "connections_opened": connections,
+            # Fração das requisições que saíram por uma conexão já aberta
+            "reuse_rate": round(1 - connections / requests_sent, 4) if requests_sent else 0.0,
+            "idle_resets": self.idle_resets,
+        }
+
+
+class LLMClientRegistry:
+    """
+    Registro thread-safe de clientes de LLM, para não recriar conexões a cada requisição.
+    - OpenAI: um cliente por chave, com pool httpx de tamanho configurável;
+    - Gemini: alguns clientes de transporte por chave (sem genai.configure global); o
+      GenerativeModel é só um invólucro barato, criado por chamada sobre esses clientes.
+    Chaves de API nunca aparecem nas métricas: só o hash.
+    """
+
+    def __init__(self, provider: str = LLM_PROVIDER):
+        self.provider = provider
+        self.fake = provider == "fake"
+        if self.fake:
+            logger.warning("LLM_PROVIDER=fake: respostas simuladas, nenhuma API externa será chamada")
+        self._lock = threading.Lock()
+        self._openai: Dict[str, OpenAI] = {}
+        self._gemini: Dict[str, List[Any]] = {}
+        self._gemini_cycle: Dict[str, Any] = {}
+        self._gemini_model_service: Dict[str, Any] = {}
+        self.stream_session = FakeStreamSession() if self.fake else PooledSession()
+
+    # --- OpenAI ---
+
+    def openai_client(self, api_key: str) -> OpenAI:
+        key = _digest("fake" if self.fake else api_key)
+        client = self._openai.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._openai.get(key)
+            if client is None and self.fake:
+                client = self._openai[key] = FakeOpenAI()
+            elif client is None:
+                http_client = httpx.Client(
+                    timeout=OPENAI_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                    ),
+                )
+                client = OpenAI(api_key=api_key, http_client=http_client)
+                self._openai[key] = client
+        return client
+
+    # --- Gemini ---
+
+    def _gemini_client(self, api_key: str, kind: str):
+        """
+        Cliente do SDK só desta chave. _ClientManager é interno ao google-generativeai
+        (versão fixada no requirements.txt); se sumir, volta ao genai.configure global
+        e retorna None (o SDK usa então o cliente global).
+        """
+        manager_class = getattr(genai_client, "_ClientManager", None)
+        if manager_class is None:
+            genai.configure(api_key=api_key, transport=GEMINI_TRANSPORT)
+            return None
+        manager = manager_class()
+        manager.configure(api_key=api_key, transport=GEMINI_TRANSPORT)
+        return manager.get_default_client(kind)
+
+    def _gemini_transport(self, api_key: str):
+        """Próximo cliente de transporte da chave (criado sob demanda, sem estado global)"""
+        if getattr(genai_client, "_ClientManager", None) is None:
+            with self._lock:
+                return self._gemini_client(api_key, "generative")
+        key = _digest(api_key)
+        with self._lock:
+            if key not in self._gemini:
+                clients = [
+                    self._gemini_client(api_key, "generative")
+                    for _ in range(max(1, GEMINI_CLIENTS_PER_KEY))
+                ]
+                self._gemini[key] = clients
+                self._gemini_cycle[key] = itertools.cycle(clients)
+            return next(self._gemini_cycle[key])
+
+    def gemini_model(
+        self,
+        api_key: str,
+        model_name: str,
+        system_instruction: Optional[str] = None,
+        generation_config: Optional[Dict] = None,
+    ) -> genai.GenerativeModel:
+        """
+        GenerativeModel sobre o cliente de transporte da chave. Não fica em cache: o prompt do
+        sistema (com o contexto do RAG) muda a cada pergunta e o custo está no transporte.
+        """
+        if self.fake:
+            return FakeGenerativeModel(model_name, generation_config=generation_config)
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=system_instruction,
+            generation_config=generation_config,
+        )
+        transport = self._gemini_transport(api_key)
+        # O GenerativeModel usa o cliente global do genai.configure quando _client é None
+        if transport is not None and hasattr(model, "_client"):
+            model._client = transport
+        return model
+
+    def gemini_list_models(self, api_key: str):
+        """
+        Catálogo de modelos Gemini da chave, no formato de genai.list_models().
+        Usa um ModelServiceClient próprio da chave (sem genai.configure global).
+        """
+        if self.fake:
+            return fake_gemini_models()
+        key = _digest(api_key)
+        with self._lock:
+            client = self._gemini_model_service.get(key)
+            if client is None:
+                client = self._gemini_client(api_key, "model")
+                if client is None:
+                    return list(genai.list_models())
+                self._gemini_model_service[key] = client
+        return genai.list_models(client=client)
+
+    # --- Observabilidade ---
+
+    @staticmethod
+    def _openai_pool_stats(client: OpenAI) -> Dict[str, int]:
+        try:
+            connections = client._client._transport._pool.connections
+        except AttributeError:
+            return {}
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def stats(self) -> dict:
+        with self._lock:
+            openai_clients = dict(self._openai)
+            gemini_clients = {key: len(clients) for key, clients in self._gemini.items()}
+        return {
+            "provider": self.provider,
+            "openai": {
+                "clients": len(openai_clients),
+                "max_connections": OPENAI_MAX_CONNECTIONS,
+                "max_keepalive": OPENAI_MAX_KEEPALIVE,
+                "pools": {key: self._openai_pool_stats(c) for key, c in openai_clients.items()},
+            },
+            "openai_stream": self.stream_session.stats(),
+            "gemini": {
+                "keys": len(gemini_clients),
+                "clients_per_key": GEMINI_CLIENTS_PER_KEY,
+                "transport": GEMINI_TRANSPORT or "default",
+            },
+        }
+
+
+llm_clients = LLMClientRegistry()
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Catálogo de modelos: fresco por MODEL_CATALOG_TTL segundos; depois disso é servido "stale"
+# enquanto uma atualização roda em segundo plano, até MODEL_CATALOG_MAX_STALE
+MODEL_CATALOG_TTL = float(os.getenv("MODEL_CATALOG_TTL", "3600"))
+MODEL_CATALOG_MAX_STALE = float(os.getenv("MODEL_CATALOG_MAX_STALE", "604800"))
+# Snapshot em disco compartilhado entre os workers (um worker novo já começa com o catálogo)
+MODEL_CATALOG_SNAPSHOT = os.getenv(
+    "MODEL_CATALOG_SNAPSHOT", os.path.join(os.path.dirname(__file__), "../data/model_catalog.json")
+)
+
+
+class ModelCatalog:
+    """
+    Cache stale-while-revalidate da lista de modelos disponíveis.
+    - dentro do TTL: responde da memória;
+    - vencido (até max_stale): responde o que tem e dispara uma única atualização em segundo plano;
+    - sem catálogo ou velho demais: atualiza na hora (uma thread consulta, as outras esperam).
+    Antes de consultar as APIs, confere se outro worker já gravou um snapshot mais novo.
+    Se a atualização falha, o catálogo anterior continua sendo servido.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[str]],
+        ttl: float = MODEL_CATALOG_TTL,
+        max_stale: float = MODEL_CATALOG_MAX_STALE,
+        snapshot_path: Optional[str] = MODEL_CATALOG_SNAPSHOT,
+        scope: str = "",
+    ):
+        """`scope` identifica a configuração (provedor/chaves): snapshot de outra configuração é ignorado"""
+        self.loader = loader
+        self.scope = hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16]
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.snapshot_path = snapshot_path
+        self._models: Optional[List[str]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+        self._refreshing = False
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.snapshot_loads = 0
+        self.last_error: Optional[str] = None
+
+    # --- Snapshot em disco ---
+
+    def _load_snapshot(self) -> bool:
+        """Adota o snapshot do disco se ele for mais novo que o catálogo em memória"""
+        if not self.snapshot_path:
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Snapshot do catálogo de modelos ilegível: {e}")
+            return False
+        fetched_at = float(data.get("fetched_at", 0))
+        with self._lock:
+            if (
+                data.get("scope") != self.scope
+                or fetched_at <= self._fetched_at
+                or not isinstance(data.get("models"), list)
+            ):
+                return False
+            self._models = data["models"]
+            self._fetched_at = fetched_at
+            self.snapshot_loads += 1
+        return True
+
+    def _save_snapshot(self, models: List[str], fetched_at: float):
+        if not self.snapshot_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"scope": self.scope, "fetched_at": fetched_at, "models": models}, f, ensure_ascii=False)
+            # Troca atômica: outro worker nunca lê um arquivo pela metade
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar snapshot do catálogo de modelos: {e}")
+
+    # --- Atualização ---
+
+    def refresh(self) -> List[str]:
+        """Consulta as APIs agora (gancho de atualização manual). Levanta a exceção se falhar."""
+        with self._refresh_lock:
+            try:
+                models = list(self.loader())
+            except Exception as e:
+                self.refresh_failures += 1
+                self.last_error = str(e)
+                raise
+            fetched_at = time.time()
+            with self._lock:
+                self._models = models
+                self._fetched_at = fetched_at
+                self.refreshes += 1
+                self.last_error = None
+            self._save_snapshot(models, fetched_at)
+            return models
+
+    def _refresh_quietly(self):
+        try:
+            # Outro worker pode ter atualizado o snapshot enquanto isso
+            if not (self._load_snapshot() and time.time() - self._fetched_at < self.ttl):
+                self.refresh()
+        except Exception as e:
+            logger.error(f"Falha ao atualizar o catálogo de modelos: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._refresh_quietly, name="model-catalog-refresh", daemon=True
+        ).start()
+
+    def age(self) -> Optional[float]:
+        return time.time() - self._fetched_at if self._models is not None else None
+
+    def get(self) -> List[str]:
+        if self._models is None:
+            self._load_snapshot()
+        age = self.age()
+        if age is not None and age < self.ttl:
+            self.fresh_hits += 1
+            return self._models
+        if age is not None and age < self.max_stale:
+            self.stale_hits += 1
+            self._refresh_in_background()
+            return self._models
+
+        # Nada utilizável: atualiza na hora (quem chegar enquanto isso espera o mesmo resultado)
+        with self._refresh_lock:
+            self._load_snapshot()
+            age = self.age()
+            if age is not None and age < self.max_stale:
+                # Outra thread (ou outro worker, via snapshot) atualizou enquanto esperávamos
+                return self._models
+            try:
+                return self.refresh()
+            except Exception as e:
+                logger.error(f"Falha ao consultar o catálogo de modelos: {e}")
+                if self._models is not None:
+                    return self._models
+                raise
+
+    def stats(self) -> dict:
+        age = self.age()
+        return {
+            "ttl": self.ttl,
+            "max_stale": self.max_stale,
+            "size": len(self._models) if self._models is not None else 0,
+            "age": round(age, 1) if age is not None else None,
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "snapshot_loads": self.snapshot_loads,
+            "refreshing": self._refreshing,
+            "last_error": self.last_error,
+        }
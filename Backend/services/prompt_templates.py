@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PERSONA_PATH = os.path.join(os.path.dirname(__file__), "data/sentryai.json")
+
+# Delimitador dos campos variáveis dentro de um template (não aparece em texto normal)
+_FIELD_MARK = "\x00"
+
+
+def field(name: str) -> str:
+    """Marcador de um campo a ser preenchido no render (ex: field('user_name'))"""
+    return f"{_FIELD_MARK}{name}{_FIELD_MARK}"
+
+
+class PromptTemplate:
+    """
+    Texto do prompt já montado, com os campos variáveis pré-separados.
+    O render só faz um join: nada de reler arquivo nem reconstruir o texto a cada chamada.
+    """
+
+    def __init__(self, text: str):
+        # Posições pares são texto fixo, ímpares são nomes de campo
+        self.segments = text.split(_FIELD_MARK)
+
+    def render(self, **values) -> str:
+        parts = list(self.segments)
+        for i in range(1, len(parts), 2):
+            parts[i] = str(values.get(parts[i], ""))
+        return "".join(parts)
+
+
+class PersonaCache:
+    """
+    Cache do sentryai.json: o arquivo é parseado uma vez e os templates construídos a partir
+    dele ficam em memória até o mtime mudar (editar o JSON não exige reiniciar o servidor).
+    """
+
+    def __init__(self, path: str = PERSONA_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._data: Dict = {}
+        self._templates: Dict[str, PromptTemplate] = {}
+        self.reloads = 0
+
+    def _refresh(self):
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._data = data
+            self._templates = {}
+            self._mtime = mtime
+            self.reloads += 1
+            logger.info("sentryai.json carregado (recarga nº %d)", self.reloads)
+
+    def data(self) -> Dict:
+        """Conteúdo parseado do sentryai.json (não modificar)"""
+        self._refresh()
+        return self._data
+
+    def template(self, name: str, builder: Callable[[Dict], str]) -> PromptTemplate:
+        """Template `name` construído por builder(data), refeito só quando o arquivo muda"""
+        self._refresh()
+        templates = self._templates
+        template = templates.get(name)
+        if template is None:
+            template = PromptTemplate(builder(self._data))
+            templates[name] = template
+        return template
+
+    def stats(self) -> dict:
+        return {"reloads": self.reloads, "templates": len(self._templates), "mtime": self._mtime}
+
+
+persona_cache = PersonaCache()
@@ -0,0 +1,404 @@
+import contextvars
+import math
+import os
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.rate_limiter import RATE_LIMIT_RETRIES, RateLimitExceeded, is_rate_limit_error, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Hedging: se o provedor principal não entregar o primeiro token até o p95 dele (x fator),
+# o provedor reserva é disparado e fica valendo quem responder primeiro. Desligado por padrão:
+# a chamada em dobro custa cota dos dois provedores
+PROVIDER_HEDGING = os.getenv("PROVIDER_HEDGING", "false").lower() == "true"
+HEDGE_P95_FACTOR = float(os.getenv("PROVIDER_HEDGE_P95_FACTOR", "1.0"))
+HEDGE_MIN_DELAY = float(os.getenv("PROVIDER_HEDGE_MIN_DELAY", "0.5"))
+# Sem essa quantidade de amostras não há p95 confiável, e o hedge não é disparado
+HEDGE_MIN_SAMPLES = int(os.getenv("PROVIDER_HEDGE_MIN_SAMPLES", "20"))
+# Últimas latências guardadas por provedor
+LATENCY_WINDOW = int(os.getenv("PROVIDER_LATENCY_WINDOW", "200"))
+# Circuit breaker: falhas seguidas para abrir e tempo (s) até tentar de novo
+BREAKER_THRESHOLD = int(os.getenv("PROVIDER_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("PROVIDER_BREAKER_COOLDOWN", "30"))
+
+# Modelo usado quando o pedido cai para o outro provedor
+FALLBACK_MODELS = {
+    "gemini": os.getenv("PROVIDER_FALLBACK_GEMINI_MODEL", "gemini-2.5-flash"),
+    "openai": os.getenv("PROVIDER_FALLBACK_OPENAI_MODEL", "gpt-4o-mini"),
+}
+PROVIDER_KEY_ENV = {"gemini": "GEMINI_API_KEY", "openai": "OPENAI_TOKEN"}
+
+_END = object()
+
+
+class _Cancelled(Exception):
+    """A tentativa perdeu a corrida antes de chamar a API"""
+
+
+def provider_of(model: str) -> str:
+    return "gemini" if "gemini" in (model or "").lower() else "openai"
+
+
+class Attempt:
+    """
+    Uma forma de atender o pedido: provedor + função sem argumentos que chama a API.
+    api_key identifica o balde do limitador de requisições.
+    """
+
+    def __init__(self, provider: str, func: Callable[[], Any], api_key: Optional[str] = None):
+        self.provider = provider
+        self.func = func
+        self.api_key = api_key
+
+
+class LatencyWindow:
+    """Janela deslizante de latências (s) para p50/p95"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+class CircuitBreaker:
+    """
+    closed -> open após `threshold` falhas seguidas; depois de `cooldown` segundos deixa
+    passar uma tentativa de teste (half_open): sucesso fecha, falha abre de novo.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def available(self) -> bool:
+        """Como allow(), mas sem efeito colateral: não consome a tentativa de teste"""
+        return self.state == "closed" or time.monotonic() - self.opened_at >= self.cooldown
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        # Open (ou teste half_open sem resposta) há mais de cooldown: libera nova tentativa
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class _ProviderState:
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        # "ttft": tempo até o primeiro token (streaming); "call": chamada completa
+        self.latency = {"ttft": LatencyWindow(), "call": LatencyWindow()}
+        self.successes = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        # Perdedores de hedge interrompidos antes da chamada ou com o resultado descartado
+        self.cancelled = 0
+
+
+class ProviderRouter:
+    """
+    Encaminha uma chamada de LLM entre provedores (Gemini/OpenAI):
+    - pula provedores com o circuit breaker aberto;
+    - failover: se o provedor da vez falha antes de responder, tenta o próximo;
+    - hedging (só para chamadas curtas e idempotentes): se o principal não respondeu até o
+      prazo derivado do p95 dele, dispara o próximo em paralelo; o primeiro a responder vence.
+      O stream do perdedor é fechado; uma chamada completa já enviada não tem como ser
+      interrompida, então só é abandonada se ainda estiver na fila do limitador e, se não,
+      tem o resultado descartado.
+    """
+
+    def __init__(self, hedging: bool = PROVIDER_HEDGING):
+        self.hedging = hedging
+        self._providers: Dict[str, _ProviderState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, provider: str) -> _ProviderState:
+        with self._lock:
+            return self._providers.setdefault(provider, _ProviderState())
+
+    def targets(self, model: str, api_key: str) -> List[Tuple[str, str, str]]:
+        """(provedor, modelo, chave): o modelo pedido e, se houver chave, o reserva do outro provedor"""
+        primary = provider_of(model)
+        targets = [(primary, model, api_key)]
+        secondary = "openai" if primary == "gemini" else "gemini"
+        secondary_key = os.getenv(PROVIDER_KEY_ENV[secondary])
+        if secondary_key:
+            targets.append((secondary, FALLBACK_MODELS[secondary], secondary_key))
+        return targets
+
+    def hedge_delay(self, provider: str, metric: str) -> Optional[float]:
+        """Prazo do hedge a partir do p95 do provedor; None enquanto não há amostras suficientes"""
+        state = self._state(provider)
+        with self._lock:
+            window = state.latency[metric]
+            if len(window) < HEDGE_MIN_SAMPLES:
+                return None
+            return max(HEDGE_MIN_DELAY, window.percentile(0.95) * HEDGE_P95_FACTOR)
+
+    def _available(self, attempts: List[Attempt]) -> Tuple[List[Attempt], bool]:
+        """
+        Tentativas cujo breaker aceitaria uma chamada agora, sem mexer no estado dele
+        (allow() só é chamado ao disparar). O bool indica que todos estão abertos.
+        """
+        with self._lock:
+            allowed = [a for a in attempts if self._providers.setdefault(a.provider, _ProviderState()).breaker.available()]
+        # Todos os breakers abertos: melhor tentar o principal do que nem tentar
+        return (allowed, False) if allowed else (attempts[:1], True)
+
+    def _allow(self, provider: str) -> bool:
+        state = self._state(provider)
+        with self._lock:
+            return state.breaker.allow()
+
+    def _record(self, provider: str, metric: str, seconds: float):
+        state = self._state(provider)
+        with self._lock:
+            state.latency[metric].add(seconds)
+            state.successes += 1
+            state.breaker.record_success()
+
+    def _count(self, provider: str, counter: str):
+        state = self._state(provider)
+        with self._lock:
+            setattr(state, counter, getattr(state, counter) + 1)
+
+    def _record_failure(self, provider: str, error: Exception):
+        state = self._state(provider)
+        with self._lock:
+            state.failures += 1
+            state.breaker.record_failure()
+        logger.warning(f"Provedor {provider} falhou: {error}")
+
+    def _start(self, attempt: Attempt, metric: str, stop: threading.Event):
+        """
+        Passa pelo limitador e faz a chamada. Em 429 antes de qualquer saída, adia a chave
+        (backoff com jitter) e tenta de novo no mesmo provedor, até RATE_LIMIT_RETRIES vezes.
+        Retorna (início da chamada, resultado) ou, em streaming, (início, iterador, primeiro token).
+        """
+        for retry in range(RATE_LIMIT_RETRIES + 1):
+            rate_limiter.acquire(attempt.provider, attempt.api_key)
+            # Outra tentativa venceu enquanto esta esperava o limitador: nem chega a chamar a API
+            if stop.is_set():
+                raise _Cancelled()
+            started = time.perf_counter()
+            iterator = None
+            try:
+                if metric == "call":
+                    return started, attempt.func()
+                iterator = iter(attempt.func())
+                # O 429 do streaming chega junto com o primeiro token
+                return started, iterator, next(iterator, _END)
+            except Exception as e:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    close()
+                if not is_rate_limit_error(e):
+                    raise
+                rate_limiter.penalize(attempt.provider, attempt.api_key)
+                if retry == RATE_LIMIT_RETRIES or stop.is_set():
+                    raise
+
+    def _pump(self, index: int, attempt: Attempt, metric: str, out: queue.Queue, stop: threading.Event):
+        """Roda uma tentativa em thread própria e publica os eventos (token/done/error) na fila"""
+        iterator = None
+        try:
+            if metric == "call":
+                started, result = self._start(attempt, metric, stop)
+                # A latência do perdedor também é uma amostra válida para o p95
+                self._record(attempt.provider, metric, time.perf_counter() - started)
+                if stop.is_set():
+                    # Perdeu a corrida: ninguém vai ler o resultado
+                    self._count(attempt.provider, "cancelled")
+                    return
+                out.put((index, "done", result))
+                return
+            started, iterator, token = self._start(attempt, metric, stop)
+            self._record(attempt.provider, metric, time.perf_counter() - started)
+            while token is not _END:
+                if stop.is_set():
+                    self._count(attempt.provider, "cancelled")
+                    return
+                out.put((index, "token", token))
+                token = next(iterator, _END)
+            out.put((index, "done", None))
+        except _Cancelled:
+            self._count(attempt.provider, "cancelled")
+        except Exception as e:
+            # Fila local cheia não é falha do provedor: não conta para o circuit breaker
+            if not stop.is_set() and not isinstance(e, RateLimitExceeded):
+                self._record_failure(attempt.provider, e)
+            out.put((index, "error", e))
+        finally:
+            # Fecha o gerador do perdedor (encerra a conexão de streaming)
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def _race(self, attempts: List[Attempt], metric: str, hedge: bool) -> Iterator[Tuple[str, Any]]:
+        attempts, forced = self._available(attempts)
+        out: queue.Queue = queue.Queue()
+        stops: List[threading.Event] = []
+
+        def launch():
+            index = len(stops)
+            stops.append(threading.Event())
+            # O breaker pode ter mudado (ex: outro pedido ficou com a tentativa de teste do half_open)
+            if not forced and not self._allow(attempts[index].provider):
+                out.put((index, "error", RuntimeError(f"Circuit breaker de {attempts[index].provider} aberto")))
+                return
+            # copy_context: o prazo da chamada orquestrada (llm_async.call_timeout) chega ao SDK
+            threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._pump, index, attempts[index], metric, out, stops[index]),
+                name=f"llm-{attempts[index].provider}",
+                daemon=True,
+            ).start()
+
+        launch()
+        pending = 1
+        deadline = None
+        if hedge and self.hedging and len(attempts) > 1:
+            delay = self.hedge_delay(attempts[0].provider, metric)
+            if delay is not None:
+                deadline = time.monotonic() + delay
+        winner = None
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+                try:
+                    index, kind, value = out.get(timeout=timeout)
+                except queue.Empty:
+                    # Prazo de hedge estourado sem resposta do principal
+                    deadline = None
+                    self._count(attempts[0].provider, "hedges")
+                    launch()
+                    pending += 1
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        pending -= 1
+                        if pending:
+                            continue
+                        if len(stops) == len(attempts):
+                            raise value
+                        deadline = None
+                        self._count(attempts[len(stops)].provider, "failovers")
+                        launch()
+                        pending += 1
+                        continue
+                    winner = index
+                    deadline = None
+                    for i, stop in enumerate(stops):
+                        if i != winner:
+                            stop.set()
+                    if winner > 0 and pending > 1:
+                        self._count(attempts[winner].provider, "hedge_wins")
+
+                if index != winner:
+                    continue
+                if kind == "error":
+                    raise value
+                yield kind, value
+                if kind == "done":
+                    return
+        finally:
+            for stop in stops:
+                stop.set()
+
+    def call(self, attempts: List[Attempt], hedge: bool = False) -> Any:
+        """Chamada completa (não-streaming); levanta o último erro se todos falharem"""
+        race = self._race(attempts, "call", hedge)
+        try:
+            for _, value in race:
+                return value
+        finally:
+            race.close()
+
+    def stream(self, attempts: List[Attempt], hedge: bool = False) -> Iterator[str]:
+        """
+        Streaming de tokens. O failover/hedge só acontece antes do primeiro token;
+        depois disso o provedor vencedor vai até o fim (um erro no meio é repassado).
+        """
+        race = self._race(attempts, "ttft", hedge)
+        try:
+            for kind, value in race:
+                if kind == "token":
+                    yield value
+        finally:
+            race.close()
+
+    @staticmethod
+    def _rounded(value: Optional[float]) -> Optional[float]:
+        return round(value, 3) if value is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            providers = {
+                name: {
+                    "breaker": state.breaker.state,
+                    "breaker_trips": state.breaker.trips,
+                    "consecutive_failures": state.breaker.consecutive_failures,
+                    "successes": state.successes,
+                    "failures": state.failures,
+                    "hedges": state.hedges,
+                    "hedge_wins": state.hedge_wins,
+                    "failovers": state.failovers,
+                    "cancelled": state.cancelled,
+                    "latency": {
+                        metric: {
+                            "samples": len(window),
+                            "p50": round(window.percentile(0.5), 3) if len(window) else None,
+                            "p95": round(window.percentile(0.95), 3) if len(window) else None,
+                        }
+                        for metric, window in state.latency.items()
+                    },
+                }
+                for name, state in self._providers.items()
+            }
+        return {
+            "hedging": self.hedging,
+            "hedge_delays": {
+                name: {metric: self._rounded(self.hedge_delay(name, metric)) for metric in ("ttft", "call")}
+                for name in providers
+            },
+            "providers": providers,
+        }
+
+
+provider_router = ProviderRouter()
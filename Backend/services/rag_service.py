@@ -1,100 +1,870 @@
 import chromadb
 import os
+import json
+import time
+import threading
 import google.generativeai as genai
 from openai import OpenAI
-from chromadb.utils import embedding_functions
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 import logging
+from services.ingest_manifest import IngestManifest, content_hash
+from services.cache_service import LRUCache, TTLCache, normalize_query
+from services.lexical_index import BM25Index, tokenize
+from services.citation_index import CitationIndex, parse_citations
+from services.legal_sources import laws_in_text
+from services.legal_chunker import chunk_legal_text, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNKER_VERSION
+from services.tokens import tokenizer_name
+from services.context_packer import pack_context
+from services.vector_snapshot import VectorSnapshot, export_snapshot
+from services.embedding_backends import EMBEDDING_BACKEND, collection_suffix, get_embedding_function
 
 logger = logging.getLogger(__name__)
 
+# Diretório de dados do RAG (banco vetorial + índices auxiliares)
+RAG_DATA_DIR = os.path.join(os.path.dirname(__file__), "../data")
+
 # Configuração do Banco Vetorial (Persistente em disco)
-CHROMA_DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/chroma_db")
+CHROMA_DATA_PATH = os.path.join(RAG_DATA_DIR, "chroma_db")
+
+# Nome base da coleção; backends de embedding diferentes do default ganham sufixo
+COLLECTION_NAME = "legislacao_brasileira"
+
+# Marca de versão da coleção: tocada a cada ingestão para invalidar caches de outros processos
+INGEST_STAMP_PATH = os.path.join(CHROMA_DATA_PATH, "ingest.stamp")
+
+# Caches de consulta (embedding da pergunta e resultado da busca)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "2048"))
+SEARCH_CACHE_SIZE = int(os.getenv("RAG_SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("RAG_SEARCH_CACHE_TTL", "600"))
+
+# Modo de busca padrão: "vector", "lexical" (BM25) ou "hybrid" (fusão dos dois)
+SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "hybrid").lower()
+# Peso do score vetorial na fusão híbrida (1 - alpha vai para o BM25)
+HYBRID_ALPHA = float(os.getenv("RAG_HYBRID_ALPHA", "0.5"))
+# Quantos candidatos de cada lado entram na fusão, por resultado pedido
+HYBRID_CANDIDATES_FACTOR = 4
+
+# Máximo de chunks trazidos por citações explícitas ("art. 477 da CLT")
+MAX_CITED_CHUNKS = int(os.getenv("RAG_MAX_CITED_CHUNKS", "6"))
+
+# Ingestão em lote: tamanho de cada upsert e nº de processos que calculam embeddings
+INGEST_BATCH_SIZE = int(os.getenv("RAG_INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+# Uma coleção por norma (CLT, CDC, CF...) em vez de uma coleção única
+SHARDED_COLLECTIONS = os.getenv("RAG_SHARDED_COLLECTIONS", "false").lower() == "true"
+# Threads para consultar as coleções por norma em paralelo
+SHARD_SEARCH_WORKERS = int(os.getenv("RAG_SHARD_SEARCH_WORKERS", "8"))
+# Restringe a busca às normas citadas na pergunta (sem citação, busca em todas as indexadas)
+LAW_ROUTING = os.getenv("RAG_LAW_ROUTING", "true").lower() == "true"
+
+# Onde a busca vetorial roda: "chroma" ou "snapshot" (matriz mmap somente-leitura,
+# exportada com ingest_laws.py --export-snapshot e compartilhada entre os workers)
+VECTOR_STORE = os.getenv("RAG_VECTOR_STORE", "chroma").lower()
+
+# Threads para buscas disparadas em paralelo ao restante da requisição (ex: rota de streaming)
+RETRIEVAL_WORKERS = int(os.getenv("RAG_RETRIEVAL_WORKERS", "4"))
+
+# Aquecimento que falhou é tentado de novo com backoff exponencial (s) até dar certo
+WARMUP_RETRY_BASE = float(os.getenv("RAG_WARMUP_RETRY_BASE", "5"))
+WARMUP_RETRY_MAX = float(os.getenv("RAG_WARMUP_RETRY_MAX", "300"))
+
+
+# --- Workers de embedding (rodam em processos separados) ---
+_worker_emb_fn = None
+
+
+def _init_embedding_worker(backend: str):
+    """Carrega o modelo de embedding uma única vez por processo."""
+    global _worker_emb_fn
+    _worker_emb_fn = get_embedding_function(backend)
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """Calcula os embeddings de um lote dentro do processo worker."""
+    embeddings = _worker_emb_fn(texts)
+    return [[float(x) for x in emb] for emb in embeddings]
 
 class RAGService:
+    data_dir = RAG_DATA_DIR
+    chroma_path = CHROMA_DATA_PATH
+    stamp_path = INGEST_STAMP_PATH
+    embedding_backend = EMBEDDING_BACKEND
+    sharded = SHARDED_COLLECTIONS
+    vector_store = VECTOR_STORE
+
     _client = None
-    _collection = None
+    _collections: Dict[str, object] = {}
+    _shard_laws = None
+    _embedding_function = None
+    _snapshot = None
+    _lexical_index = None
+    _citation_index = None
+
+    _embedding_cache = LRUCache(max_size=QUERY_EMBEDDING_CACHE_SIZE)
+    _search_cache = TTLCache(max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+    _seen_stamp = None
+    # Caches de outros módulos que dependem do conteúdo da coleção (ex: respostas prontas)
+    _invalidation_listeners: List[Callable[[], object]] = []
+
+    _retrieval_executor = None
+    _fanout_executor = None
+    _retrieval_lock = threading.Lock()
+
+    # Estado do aquecimento (warm-up) usado pela rota de prontidão
+    _warm = False
+    _warmup_started = False
+    _warmup_error = None
+    _warmup_seconds = None
+    _warmup_attempts = 0
+    _warmup_next_retry = None
 
     @classmethod
-    def get_collection(cls):
+    def get_client(cls):
         """Singleton para conexão com ChromaDB"""
-        if cls._collection:
-            return cls._collection
+        if cls._client is None:
+            try:
+                cls._client = chromadb.PersistentClient(path=cls.chroma_path)
+            except Exception as e:
+                logger.error(f"Falha ao iniciar ChromaDB: {e}")
+                return None
+        return cls._client
 
+    @classmethod
+    def get_collection(cls, law: Optional[str] = None):
+        """
+        Coleção vetorial (singleton por nome). No modo fragmentado, `law` escolhe
+        a coleção da norma; sem fragmentação existe uma coleção única.
+        """
+        name = cls.collection_name(law if cls.sharded else None)
+        collection = cls._collections.get(name)
+        if collection is not None:
+            return collection
+
+        client = cls.get_client()
+        if client is None:
+            return None
         try:
-            # Inicializa cliente persistente
-            cls._client = chromadb.PersistentClient(path=CHROMA_DATA_PATH)
-            
-            # Tenta usar função de embedding do Google ou OpenAI, senão usa default (all-MiniLM-L6-v2)
-            # Para simplificar neste MVP, usamos o embedding default do Chroma 
-            # (que baixa um modelo pequeno localmente) para evitar custos de API em cada indexação.
-            # Em produção, idealmente usaria: embedding_functions.GoogleGenerativeAiEmbeddingFunction
-            
-            emb_fn = embedding_functions.DefaultEmbeddingFunction()
-            
-            cls._collection = cls._client.get_or_create_collection(
-                name="legislacao_brasileira",
-                embedding_function=emb_fn
-            )
-            return cls._collection
+            # Função de embedding plugável (services/embedding_backends.py). O default é o
+            # all-MiniLM-L6-v2 do Chroma, que roda localmente e evita custos de API na indexação.
+            # Backends adicionais podem ser registrados com register_embedding_backend.
+            emb_fn = cls._load_embedding_function()
+
+            collection = client.get_or_create_collection(name=name, embedding_function=emb_fn)
+            cls._collections[name] = collection
+            return collection
         except Exception as e:
-            logger.error(f"Falha ao iniciar ChromaDB: {e}")
+            logger.error(f"Falha ao abrir a coleção {name}: {e}")
+            return None
+
+    @classmethod
+    def shard_laws(cls) -> List[str]:
+        """Normas que já têm coleção própria (modo fragmentado)"""
+        if cls._shard_laws is None:
+            client = cls.get_client()
+            if client is None:
+                return []
+            prefix = cls.collection_name() + "__"
+            names = [getattr(c, "name", c) for c in client.list_collections()]
+            cls._shard_laws = sorted(n[len(prefix):].upper() for n in names if n.startswith(prefix))
+        return cls._shard_laws
+
+    @classmethod
+    def get_collections(cls, laws: Optional[List[str]] = None) -> Dict[Optional[str], object]:
+        """
+        Coleções a consultar: {norma: coleção} no modo fragmentado (filtradas por `laws`)
+        ou {None: coleção única}.
+        """
+        if not cls.sharded:
+            collection = cls.get_collection()
+            return {None: collection} if collection is not None else {}
+
+        collections = {}
+        for law in cls.shard_laws():
+            if laws is None or law in laws:
+                collection = cls.get_collection(law)
+                if collection is not None:
+                    collections[law] = collection
+        return collections
+
+    @classmethod
+    def collection_name(cls, law: Optional[str] = None) -> str:
+        name = COLLECTION_NAME + collection_suffix(cls.embedding_backend)
+        return f"{name}__{law.lower()}" if law else name
+
+    @classmethod
+    def index_suffix(cls) -> str:
+        """Sufixo dos arquivos que acompanham a coleção atual (um conjunto por backend de embedding e layout)"""
+        return collection_suffix(cls.embedding_backend) + ("_sharded" if cls.sharded else "")
+
+    @classmethod
+    def manifest_path(cls) -> str:
+        """Manifesto de ingestão da coleção atual"""
+        return os.path.join(cls.data_dir, f"ingest_manifest{cls.index_suffix()}.json")
+
+    @classmethod
+    def lexical_index_path(cls) -> str:
+        return os.path.join(cls.data_dir, f"lexical_index{cls.index_suffix()}.json")
+
+    @classmethod
+    def citation_index_path(cls) -> str:
+        return os.path.join(cls.data_dir, f"citation_index{cls.index_suffix()}.json")
+
+    @classmethod
+    def snapshot_path(cls) -> str:
+        """Snapshot vetorial somente-leitura (um por backend de embedding)"""
+        return os.path.join(cls.data_dir, f"vector_snapshot{collection_suffix(cls.embedding_backend)}")
+
+    @classmethod
+    def get_snapshot(cls) -> Optional[VectorSnapshot]:
+        """Snapshot mapeado em memória, carregado sob demanda (None se não exportado)"""
+        if cls._snapshot is None:
+            try:
+                snapshot = VectorSnapshot.load(cls.snapshot_path())
+            except (OSError, ValueError) as e:
+                logger.error(f"Snapshot vetorial inválido: {e}")
+                return None
+            if snapshot is None:
+                logger.warning("Snapshot vetorial não encontrado; rode ingest_laws.py --export-snapshot")
+                return None
+            if snapshot.embedding_backend != cls.embedding_backend:
+                logger.error(
+                    f"Snapshot gerado com o backend '{snapshot.embedding_backend}', "
+                    f"mas o serviço usa '{cls.embedding_backend}'"
+                )
+                return None
+            cls._snapshot = snapshot
+        return cls._snapshot
+
+    @classmethod
+    def export_snapshot(cls, dtype: str = "float32") -> int:
+        """Exporta as coleções do Chroma para o snapshot e avisa os workers para recarregá-lo"""
+        count = export_snapshot(
+            cls.get_collections().values(),
+            cls.snapshot_path(),
+            dtype=dtype,
+            embedding_backend=cls.embedding_backend,
+        )
+        cls.mark_ingested()
+        return count
+
+    @classmethod
+    def configure(
+        cls,
+        data_dir: Optional[str] = None,
+        embedding_backend: Optional[str] = None,
+        sharded: Optional[bool] = None,
+        vector_store: Optional[str] = None,
+    ):
+        """
+        Aponta o serviço para outro diretório de dados, backend de embedding e/ou layout
+        de coleções (ex: benchmark em pasta temporária). Descarta conexões, índices e caches já carregados.
+        """
+        if data_dir:
+            cls.data_dir = data_dir
+            cls.chroma_path = os.path.join(data_dir, "chroma_db")
+            cls.stamp_path = os.path.join(cls.chroma_path, "ingest.stamp")
+        if embedding_backend:
+            cls.embedding_backend = embedding_backend.lower()
+        if sharded is not None:
+            cls.sharded = sharded
+        if vector_store:
+            cls.vector_store = vector_store.lower()
+        cls._client = None
+        cls._collections = {}
+        cls._shard_laws = None
+        cls._embedding_function = None
+        cls._snapshot = None
+        cls._lexical_index = None
+        cls._citation_index = None
+        cls._seen_stamp = None
+        cls.invalidate_caches()
+
+    @classmethod
+    def get_lexical_index(cls) -> BM25Index:
+        """Índice BM25 com os mesmos chunks da coleção atual, carregado do disco sob demanda"""
+        if cls._lexical_index is None:
+            cls._lexical_index = BM25Index.load(cls.lexical_index_path())
+        return cls._lexical_index
+
+    @classmethod
+    def get_citation_index(cls) -> CitationIndex:
+        """Índice (norma, artigo) -> chunks, carregado do disco sob demanda"""
+        if cls._citation_index is None:
+            cls._citation_index = CitationIndex.load(cls.citation_index_path())
+        return cls._citation_index
+
+    @classmethod
+    def get_embedding_function(cls):
+        """Função de embedding usada pela coleção e pela ingestão em lote"""
+        return get_embedding_function(cls.embedding_backend)
+
+    @classmethod
+    def _load_embedding_function(cls):
+        """Instância compartilhada por todas as coleções do processo"""
+        if cls._embedding_function is None:
+            cls._embedding_function = cls.get_embedding_function()
+        return cls._embedding_function
+
+    @classmethod
+    def route_laws(cls, query: str) -> Optional[List[str]]:
+        """
+        Normas em que a pergunta deve ser buscada: as citadas nela.
+        None = todas as normas indexadas (sem filtro).
+        """
+        if not LAW_ROUTING:
             return None
+        return laws_in_text(query) or None
 
     @classmethod
     def add_document(cls, doc_id: str, text: str, metadata: dict):
         """Adiciona um trecho de lei/documento ao banco"""
-        collection = cls.get_collection()
-        if not collection: return
-
-        # Chroma lida com tokenização e embedding automaticamente com a função default
-        collection.upsert(
-            ids=[doc_id],
-            documents=[text],
-            metadatas=[metadata]
+        cls.add_documents([doc_id], [text], [metadata], workers=1)
+
+    @classmethod
+    def add_documents(
+        cls,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[dict],
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        persist: bool = True,
+    ) -> int:
+        """
+        Indexa vários trechos de uma vez.
+        Os embeddings são calculados em lotes distribuídos entre processos worker
+        e cada lote vira um único upsert no Chroma. Retorna o nº de trechos indexados.
+        Com persist=False os índices auxiliares só mudam em memória (quem chama grava
+        tudo de uma vez com save_indexes ao fim da ingestão).
+        """
+        if cls.get_client() is None or not ids:
+            return 0
+
+        batch_size = batch_size or INGEST_BATCH_SIZE
+        workers = INGEST_WORKERS if workers is None else workers
+
+        batches = [
+            (ids[i:i + batch_size], texts[i:i + batch_size], metadatas[i:i + batch_size])
+            for i in range(0, len(ids), batch_size)
+        ]
+
+        # Poucos lotes não compensam o custo de subir processos (cada um carrega o modelo)
+        if workers <= 1 or len(batches) == 1:
+            emb_fn = cls._load_embedding_function()
+            for batch_ids, batch_texts, batch_metas in batches:
+                cls._upsert(batch_ids, batch_texts, batch_metas, emb_fn(batch_texts))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(batches)),
+                initializer=_init_embedding_worker,
+                initargs=(cls.embedding_backend,),
+            ) as pool:
+                # map preserva a ordem; o upsert acontece no processo principal
+                embedded = pool.map(_embed_batch, [b[1] for b in batches])
+                for (batch_ids, batch_texts, batch_metas), embeddings in zip(batches, embedded):
+                    cls._upsert(batch_ids, batch_texts, batch_metas, embeddings)
+
+        # Mantém os índices auxiliares em sincronia com a coleção vetorial
+        cls.get_lexical_index().upsert(ids, texts, metadatas)
+        cls.get_citation_index().upsert(ids, metadatas)
+        cls._after_change(persist)
+        return len(ids)
+
+    @classmethod
+    def _upsert(cls, ids: List[str], texts: List[str], metadatas: List[dict], embeddings):
+        """Grava um lote já embedado, separando por norma no modo fragmentado"""
+        groups: Dict[Optional[str], List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            law = (metadata or {}).get("law") if cls.sharded else None
+            groups.setdefault(law, []).append(i)
+        for law, positions in groups.items():
+            collection = cls.get_collection(law)
+            if collection is None:
+                raise RuntimeError(f"Coleção indisponível para {law or 'o corpus'}")
+            collection.upsert(
+                ids=[ids[i] for i in positions],
+                documents=[texts[i] for i in positions],
+                metadatas=[metadatas[i] for i in positions],
+                embeddings=[embeddings[i] for i in positions],
+            )
+
+    @classmethod
+    def delete_documents(cls, ids: List[str], persist: bool = True) -> int:
+        """Remove trechos que deixaram de existir na fonte"""
+        collections = cls.get_collections()
+        if not collections or not ids:
+            return 0
+        for collection in collections.values():
+            collection.delete(ids=ids)
+
+        cls.get_lexical_index().delete(ids)
+        cls.get_citation_index().delete(ids)
+        cls._after_change(persist)
+        return len(ids)
+
+    @classmethod
+    def save_indexes(cls):
+        """Grava os índices lexical e de citações e avisa os demais processos da mudança"""
+        cls.get_lexical_index().save()
+        cls.get_citation_index().save()
+        cls.mark_ingested()
+
+    @classmethod
+    def _after_change(cls, persist: bool):
+        if persist:
+            cls.save_indexes()
+        else:
+            # A marca de ingestão só muda quando os índices estiverem gravados
+            cls.invalidate_caches()
+
+    @classmethod
+    def reset(cls) -> int:
+        """
+        Reconstrução completa: apaga as coleções do backend/layout atual e zera os índices
+        auxiliares, para não sobrar chunk de ingestões anteriores (ids antigos ou de outro
+        formato, como os '{source}_{idx}' sem metadado 'law'). Retorna o nº de coleções apagadas.
+        """
+        client = cls.get_client()
+        if client is None:
+            return 0
+        base = cls.collection_name()
+        names = [getattr(c, "name", c) for c in client.list_collections()]
+        dropped = [n for n in names if n == base or (cls.sharded and n.startswith(base + "__"))]
+        for name in dropped:
+            client.delete_collection(name=name)
+        cls._collections = {}
+        cls._shard_laws = None
+
+        cls._lexical_index = BM25Index(cls.lexical_index_path())
+        cls._citation_index = CitationIndex(cls.citation_index_path())
+        cls.save_indexes()
+        return len(dropped)
+
+    # --- Aquecimento ---
+
+    @classmethod
+    def warm_up(cls) -> bool:
+        """
+        Abre a coleção, carrega o modelo de embedding e os índices e roda uma consulta
+        de teste, para que o primeiro usuário não pague esse custo.
+        """
+        started = time.perf_counter()
+        cls._warmup_attempts += 1
+        try:
+            if cls.vector_store == "snapshot":
+                snapshot = cls.get_snapshot()
+                if snapshot is None:
+                    raise RuntimeError("snapshot vetorial indisponível")
+                collections = {}
+            else:
+                snapshot = None
+                collections = cls.get_collections()
+                if not collections:
+                    raise RuntimeError("coleção indisponível")
+            cls.get_lexical_index()
+            cls.get_citation_index()
+            # Consulta direta (sem passar pelos caches) apenas para carregar o modelo
+            embedding = cls._load_embedding_function()(["aquecimento do serviço de busca"])[0]
+            if snapshot is not None:
+                # Também traz as páginas do snapshot para o cache do sistema operacional
+                snapshot.search(embedding, n_results=1)
+            for collection in collections.values():
+                collection.query(query_embeddings=[embedding], n_results=1)
+            cls._warm = True
+            cls._warmup_error = None
+            logger.info("RAG aquecido em %.2fs", time.perf_counter() - started)
+        except Exception as e:
+            cls._warmup_error = str(e)
+            logger.error(f"Falha no aquecimento do RAG: {e}")
+        cls._warmup_seconds = round(time.perf_counter() - started, 3)
+        return cls._warm
+
+    @classmethod
+    def _warm_up_until_ready(cls):
+        delay = WARMUP_RETRY_BASE
+        while not cls.warm_up():
+            # Ex: coleção ainda sendo criada pela ingestão ou modelo ainda sem download
+            cls._warmup_next_retry = time.time() + delay
+            logger.info(f"Nova tentativa de aquecimento do RAG em {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(WARMUP_RETRY_MAX, delay * 2)
+        cls._warmup_next_retry = None
+
+    @classmethod
+    def start_warm_up(cls):
+        """
+        Dispara o aquecimento em uma thread de fundo (uma vez por processo). Se falhar,
+        a mesma thread tenta de novo com backoff, e a prontidão volta a "ready" sem reiniciar o processo.
+        """
+        if cls._warmup_started:
+            return
+        cls._warmup_started = True
+        threading.Thread(target=cls._warm_up_until_ready, name="rag-warmup", daemon=True).start()
+
+    @classmethod
+    def readiness(cls) -> dict:
+        if cls._warm:
+            status = "ready"
+        elif cls._warmup_error:
+            status = "error"
+        elif cls._warmup_started:
+            status = "warming"
+        else:
+            status = "cold"
+        return {
+            "status": status,
+            "warmup_seconds": cls._warmup_seconds,
+            "error": cls._warmup_error,
+            "attempts": cls._warmup_attempts,
+            "next_retry_in": (
+                round(max(0.0, cls._warmup_next_retry - time.time()), 1)
+                if cls._warmup_next_retry and not cls._warm else None
+            ),
+        }
+
+    # --- Caches de consulta ---
+
+    @classmethod
+    def mark_ingested(cls):
+        """Registra que a coleção mudou: limpa os caches locais e avisa os demais processos"""
+        cls.invalidate_caches()
+        try:
+            os.makedirs(os.path.dirname(cls.stamp_path), exist_ok=True)
+            with open(cls.stamp_path, "w") as f:
+                f.write(str(time.time()))
+            cls._seen_stamp = os.path.getmtime(cls.stamp_path)
+        except OSError as e:
+            logger.warning(f"Não foi possível atualizar a marca de ingestão: {e}")
+
+    @classmethod
+    def on_invalidate(cls, callback: Callable[[], object]):
+        """Registra um cache externo a ser limpo junto com os de consulta quando a coleção mudar"""
+        cls._invalidation_listeners.append(callback)
+
+    @classmethod
+    def invalidate_caches(cls):
+        cls._shard_laws = None
+        cls._embedding_cache.clear()
+        cls._search_cache.clear()
+        for callback in cls._invalidation_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Falha ao limpar cache dependente da coleção: {e}")
+
+    @classmethod
+    def check_ingest_stamp(cls):
+        """Invalida os caches se outro processo (ex: ingest_laws.py) reindexou a coleção"""
+        try:
+            stamp = os.path.getmtime(cls.stamp_path)
+        except OSError:
+            return
+        if cls._seen_stamp is not None and stamp != cls._seen_stamp:
+            logger.info("Coleção RAG reindexada, limpando caches de consulta")
+            cls.invalidate_caches()
+            cls._lexical_index = None
+            cls._citation_index = None
+            cls._shard_laws = None
+            cls._snapshot = None
+        cls._seen_stamp = stamp
+
+    @classmethod
+    def embed_query(cls, normalized_query: str):
+        embedding = cls._embedding_cache.get(normalized_query)
+        if embedding is None:
+            embedding = cls._load_embedding_function()([normalized_query])[0]
+            cls._embedding_cache.set(normalized_query, embedding)
+        return embedding
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        return {
+            "query_embeddings": cls._embedding_cache.stats(),
+            "search_results": cls._search_cache.stats(),
+        }
+
+    # --- Busca ---
+
+    @staticmethod
+    def _query_collection(collection, embedding, n_results: int, where: Optional[dict] = None) -> List[Dict]:
+        results = collection.query(query_embeddings=[embedding], n_results=n_results, where=where)
+        hits = []
+        if results['documents']:
+            for i, doc in enumerate(results['documents'][0]):
+                distance = results['distances'][0][i] if results.get('distances') else 0.0
+                hits.append({
+                    "id": results['ids'][0][i],
+                    "text": doc,
+                    "metadata": results['metadatas'][0][i] or {},
+                    # Distância -> similaridade (maior é melhor)
+                    "score": 1.0 / (1.0 + distance),
+                })
+        return hits
+
+    @classmethod
+    def _vector_search(
+        cls, normalized_query: str, n_results: int, laws: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """
+        Coleção única: filtra por metadado 'law'. Modo fragmentado: consulta em paralelo
+        só as coleções das normas roteadas e junta os resultados pelo score
+        (mesmo espaço de embedding, então as distâncias são comparáveis).
+        Com o snapshot, a busca é feita na matriz mapeada em memória, sem o Chroma.
+        """
+        if cls.vector_store == "snapshot":
+            snapshot = cls.get_snapshot()
+            if snapshot is None:
+                return []
+            return snapshot.search(cls.embed_query(normalized_query), n_results, laws)
+
+        collections = cls.get_collections(laws)
+        if not collections:
+            return []
+        embedding = cls.embed_query(normalized_query)
+
+        if not cls.sharded:
+            where = {"law": {"$in": list(laws)}} if laws else None
+            return cls._query_collection(collections[None], embedding, n_results, where)
+
+        if len(collections) == 1:
+            hits = cls._query_collection(next(iter(collections.values())), embedding, n_results)
+        else:
+            if cls._fanout_executor is None:
+                with cls._retrieval_lock:
+                    if cls._fanout_executor is None:
+                        cls._fanout_executor = ThreadPoolExecutor(
+                            max_workers=SHARD_SEARCH_WORKERS, thread_name_prefix="rag-shard"
+                        )
+            futures = [
+                cls._fanout_executor.submit(cls._query_collection, collection, embedding, n_results)
+                for collection in collections.values()
+            ]
+            hits = [hit for future in futures for hit in future.result()]
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        return hits[:n_results]
+
+    @classmethod
+    def has_vectors(cls, laws: Optional[List[str]] = None) -> bool:
+        if cls.vector_store == "snapshot":
+            snapshot = cls.get_snapshot()
+            return snapshot is not None and len(snapshot) > 0
+        return bool(cls.get_collections(laws))
+
+    @classmethod
+    def _lexical_search(
+        cls, normalized_query: str, n_results: int, laws: Optional[List[str]] = None
+    ) -> List[Dict]:
+        index = cls.get_lexical_index()
+        hits = []
+        for doc_id, score in index.search(normalized_query, n_results, laws=laws):
+            doc = index.get(doc_id)
+            hits.append({"id": doc_id, "text": doc["text"], "metadata": doc["metadata"], "score": score})
+        return hits
+
+    @staticmethod
+    def _fuse(vector_hits: List[Dict], lexical_hits: List[Dict], n_results: int) -> List[Dict]:
+        """Fusão linear dos scores normalizados (min-max) de cada busca"""
+        def normalized(hits):
+            if not hits:
+                return {}
+            scores = [h["score"] for h in hits]
+            low, high = min(scores), max(scores)
+            span = (high - low) or 1.0
+            return {h["id"]: (h["score"] - low) / span if high != low else 1.0 for h in hits}
+
+        vector_scores = normalized(vector_hits)
+        lexical_scores = normalized(lexical_hits)
+        by_id = {h["id"]: h for h in lexical_hits}
+        by_id.update({h["id"]: h for h in vector_hits})
+
+        fused = []
+        for doc_id, hit in by_id.items():
+            score = HYBRID_ALPHA * vector_scores.get(doc_id, 0.0) + (1 - HYBRID_ALPHA) * lexical_scores.get(doc_id, 0.0)
+            fused.append({**hit, "score": score})
+        fused.sort(key=lambda h: h["score"], reverse=True)
+        return fused[:n_results]
+
+    @classmethod
+    def search(
+        cls, query: str, n_results=3, mode: Optional[str] = None, laws: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """
+        Retorna os trechos mais relevantes como [{"id", "text", "metadata", "score"}].
+        O modo "lexical" responde só com o índice BM25, sem carregar o modelo de embedding.
+        Com `laws`, busca apenas nas normas indicadas.
+        """
+        mode = (mode or SEARCH_MODE).lower()
+        normalized = normalize_query(query)
+
+        if mode == "lexical":
+            return cls._lexical_search(normalized, n_results, laws)
+
+        if not cls.has_vectors(laws):
+            # Sem banco vetorial, o índice lexical ainda consegue responder
+            return cls._lexical_search(normalized, n_results, laws)
+
+        if mode == "vector" or not len(cls.get_lexical_index()):
+            return cls._vector_search(normalized, n_results, laws)
+
+        candidates = n_results * HYBRID_CANDIDATES_FACTOR
+        return cls._fuse(
+            cls._vector_search(normalized, candidates, laws),
+            cls._lexical_search(normalized, candidates, laws),
+            n_results,
         )
 
     @classmethod
-    def search_context(cls, query: str, n_results=3) -> str:
-        """Busca os trechos mais relevantes para a pergunta"""
-        collection = cls.get_collection()
-        if not collection: 
-            return ""
+    def lookup_citations(cls, citations) -> List[Dict]:
+        """Resolve citações explícitas direto pelo índice, sem busca vetorial"""
+        index = cls.get_citation_index()
+        lexical = cls.get_lexical_index()
+        hits = []
+        for law, article in citations:
+            for doc_id in index.lookup(law, article):
+                doc = lexical.get(doc_id)
+                if doc:
+                    hits.append({"id": doc_id, "text": doc["text"], "metadata": doc["metadata"], "score": float("inf")})
+        return hits[:MAX_CITED_CHUNKS]
+
+    @classmethod
+    def retrieve(cls, query: str, n_results=3, mode: Optional[str] = None) -> List[Dict]:
+        """
+        Citações explícitas são resolvidas pelo índice de citações; a busca
+        (vetorial/lexical/híbrida) roda só sobre o restante da pergunta, restrita
+        às normas roteadas (route_laws).
+        """
+        citations, remainder = parse_citations(query)
+        cited = cls.lookup_citations(citations) if citations else []
+        if cited and not tokenize(remainder):
+            return cited
+
+        search_query = remainder if cited else query
+        cited_ids = {h["id"] for h in cited}
+        laws = cls.route_laws(query)
+        found = cls.search(search_query, n_results, mode, laws)
+        if not found and laws:
+            # Norma roteada ainda não indexada: volta a buscar no corpus inteiro
+            found = cls.search(search_query, n_results, mode)
+        rest = [h for h in found if h["id"] not in cited_ids]
+        return cited + rest
+
+    @staticmethod
+    def format_context(hits: List[Dict]) -> str:
+        """Formata os trechos para injetar no prompt"""
+        context_str = ""
+        for hit in hits:
+            source = hit["metadata"].get('source', 'Legislação')
+            context_str += f"\n--- FONTE: {source} ---\n{hit['text']}\n"
+        return context_str
+
+    @classmethod
+    def search_context(
+        cls, query: str, n_results=3, mode: Optional[str] = None, token_budget: Optional[int] = None
+    ) -> str:
+        """
+        Busca os trechos mais relevantes para a pergunta e os empacota dentro do
+        orçamento de tokens (sem duplicatas, artigos fragmentados reunidos).
+        """
+        cls.check_ingest_stamp()
+        normalized = normalize_query(query)
+        cache_key = (normalized, n_results, (mode or SEARCH_MODE).lower(), token_budget)
+        cached = cls._search_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
         try:
-            results = collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
-            
-            # Formata o resultado para injetar no prompt
-            context_str = ""
-            if results['documents']:
-                for i, doc in enumerate(results['documents'][0]):
-                    meta = results['metadatas'][0][i]
-                    source = meta.get('source', 'Legislação')
-                    context_str += f"\n--- FONTE: {source} ---\n{doc}\n"
-            
+            hits = pack_context(cls.retrieve(normalized, n_results, mode), token_budget)
+            context_str = cls.format_context(hits)
+            cls._search_cache.set(cache_key, context_str)
             return context_str
         except Exception as e:
             logger.error(f"Erro na busca RAG: {e}")
             return ""
 
+    @classmethod
+    def search_context_async(cls, query: str, **kwargs) -> Future:
+        """
+        Dispara search_context em uma thread de fundo e devolve o Future, para que a
+        busca rode enquanto a rota carrega o histórico e grava a mensagem do usuário.
+        """
+        if cls._retrieval_executor is None:
+            with cls._retrieval_lock:
+                if cls._retrieval_executor is None:
+                    cls._retrieval_executor = ThreadPoolExecutor(
+                        max_workers=RETRIEVAL_WORKERS, thread_name_prefix="rag-retrieval"
+                    )
+        return cls._retrieval_executor.submit(cls.search_context, query, **kwargs)
+
+
 # Script utilitário para popular o banco (pode ser chamado via CLI futuramente)
-def ingest_text_file(filepath, source_name):
-    """Lê um arquivo de texto (ex: CLT.txt) e indexa em chunks"""
+def ingest_text_file(
+    filepath,
+    source_name,
+    batch_size=None,
+    workers=None,
+    manifest: Optional[IngestManifest] = None,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    save_indexes: bool = True,
+) -> int:
+    """
+    Lê um arquivo de texto (ex: CLT.txt) e indexa em chunks. Retorna o nº de chunks indexados.
+    Com um manifesto, apenas chunks novos/alterados são reindexados e os removidos são apagados.
+    Para vários arquivos, passe save_indexes=False e chame RAGService.save_indexes() no final.
+    """
+    if RAGService.get_client() is None:
+        print(f"Banco vetorial indisponível, {source_name} não foi indexado")
+        return 0
+
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             text = f.read()
+
+        # Versão, parâmetros e tokenizer do chunker entram no hash: mudá-los força o re-chunk do arquivo
+        max_tokens = max_tokens or CHUNK_MAX_TOKENS
+        overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        file_hash = content_hash(f"v{CHUNKER_VERSION}|{tokenizer_name()}|{max_tokens}|{overlap_tokens}|{text}")
+        if manifest and manifest.file_unchanged(source_name, file_hash):
+            print(f"Sem alterações: {source_name}")
+            return 0
         
-        # Split simples por parágrafos ou tamanho fixo
-        chunks = text.split('\n\n') 
-        for idx, chunk in enumerate(chunks):
-            if len(chunk.strip()) > 50: # Ignora linhas muito curtas
-                RAGService.add_document(
-                    doc_id=f"{source_name}_{idx}",
-                    text=chunk,
-                    metadata={"source": source_name}
-                )
-        print(f"Indexado: {source_name} ({len(chunks)} chunks)")
+        # Chunks respeitando Art./§/incisos/Súmulas e limitados por tokens
+        chunks = chunk_legal_text(
+            text, source_name, max_tokens=max_tokens, overlap_tokens=overlap_tokens
+        )
+        chunk_texts = {c["id"]: c["text"] for c in chunks}
+        chunk_metas = {c["id"]: c["metadata"] for c in chunks}
+
+        # Metadados entram no hash do chunk: mudar 'law'/'article' também reindexa
+        chunk_hashes = {
+            cid: content_hash(chunk + json.dumps(chunk_metas[cid], sort_keys=True, ensure_ascii=False))
+            for cid, chunk in chunk_texts.items()
+        }
+        if manifest:
+            changed, removed = manifest.diff_chunks(source_name, chunk_hashes)
+        else:
+            changed, removed = list(chunk_texts.keys()), []
+
+        RAGService.delete_documents(removed, persist=False)
+        indexed = RAGService.add_documents(
+            changed,
+            [chunk_texts[cid] for cid in changed],
+            [chunk_metas[cid] for cid in changed],
+            batch_size=batch_size,
+            workers=workers,
+            persist=False,
+        )
+        if save_indexes and (removed or changed):
+            RAGService.save_indexes()
+
+        if manifest:
+            manifest.update_file(source_name, file_hash, chunk_hashes)
+
+        skipped = len(chunk_texts) - len(changed)
+        print(f"Indexado: {source_name} ({indexed} chunks, {skipped} inalterados, {len(removed)} removidos)")
+        return indexed
     except Exception as e:
-        print(f"Erro ao indexar {filepath}: {e}")
\ No newline at end of file
+        print(f"Erro ao indexar {filepath}: {e}")
+        return 0
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+from typing import Dict, Optional
+
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+from openai import RateLimitError
+
+from services.kv_store import get_store
+
+logger = logging.getLogger(__name__)
+
+# Limite de requisições por provedor e chave, compartilhado entre threads e (com sqlite) entre workers.
+# Com LLM_PROVIDER=fake não há cota a respeitar, e o limitador fica desligado
+RATE_LIMIT_ENABLED = (
+    os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    and os.getenv("LLM_PROVIDER", "live").lower() != "fake"
+)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite").lower()  # sqlite | memory
+# Cota de cada provedor (requisições por minuto, por chave). Os padrões são conservadores
+# (Gemini pago de entrada / OpenAI tier 1): ajuste para o plano da chave usada
+RATE_LIMITS_RPM = {
+    "gemini": float(os.getenv("RATE_LIMIT_GEMINI_RPM", "60")),
+    "openai": float(os.getenv("RATE_LIMIT_OPENAI_RPM", "500")),
+}
+# Fração da cota usada de fato: o ritmo fica logo abaixo do limite em vez de bater nele
+RATE_LIMIT_HEADROOM = float(os.getenv("RATE_LIMIT_HEADROOM", "0.9"))
+# Requisições que podem sair de uma vez com o balde cheio
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+# Espera máxima na fila antes de desistir (s)
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+# Backoff exponencial (com jitter) depois de um 429 do provedor
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "1"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+# Novas tentativas no mesmo provedor depois de um 429 (antes do failover)
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "2"))
+
+_STATE_TTL = 3600
+_WAIT_WINDOW = 500
+
+
+class RateLimitExceeded(Exception):
+    """A fila do provedor passou do tempo máximo de espera"""
+
+    def __init__(self, provider: str, wait: float):
+        super().__init__(f"Limite de requisições de {provider} atingido (espera estimada de {wait:.1f}s)")
+        self.provider = provider
+        self.wait = wait
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    429 dos SDKs pelo tipo ou pelo status HTTP: Gemini ResourceExhausted/TooManyRequests,
+    openai.RateLimitError, HTTPError do streaming. A mensagem não é olhada (um "429" no
+    texto de outro erro não é limite de requisições).
+    """
+    if isinstance(error, (ResourceExhausted, TooManyRequests, RateLimitError)):
+        return True
+    return 429 in (
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    )
+
+
+class _BucketStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.waits = deque(maxlen=_WAIT_WINDOW)
+
+
+class RateLimiter:
+    """
+    Limitador por (provedor, chave) no algoritmo GCRA, equivalente a um token bucket:
+    o estado é só o "horário teórico de chegada" (tat) guardado no kv_store, atualizado de
+    forma atômica. Cada requisição reserva sua vaga e dorme até ela chegar, então as
+    requisições ficam numa fila curta em vez de falhar, e o ritmo se mantém constante em
+    rpm * headroom (sem rajadas seguidas de 429). Depois de um 429, o tat é empurrado para
+    a frente com backoff exponencial e jitter, atrasando todos os workers que usam a chave.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = RATE_LIMIT_ENABLED,
+        backend: str = RATE_LIMIT_BACKEND,
+        limits: Optional[Dict[str, float]] = None,
+        headroom: float = RATE_LIMIT_HEADROOM,
+        burst: int = RATE_LIMIT_BURST,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+    ):
+        self.enabled = enabled
+        self.backend = backend
+        self.limits = dict(RATE_LIMITS_RPM if limits is None else limits)
+        self.headroom = headroom
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self._store = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _BucketStats] = {}
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = get_store(self.backend)
+        return self._store
+
+    @staticmethod
+    def bucket(provider: str, api_key: Optional[str]) -> str:
+        return f"{provider}:{hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]}"
+
+    def interval(self, provider: str) -> Optional[float]:
+        """Segundos entre duas requisições no ritmo sustentado (None = sem limite)"""
+        rpm = self.limits.get(provider)
+        if not self.enabled or not rpm or rpm <= 0:
+            return None
+        return 60.0 / (rpm * self.headroom)
+
+    def _bucket_stats(self, bucket: str) -> _BucketStats:
+        with self._lock:
+            return self._stats.setdefault(bucket, _BucketStats())
+
+    @staticmethod
+    def _load(raw: Optional[str], now: float) -> dict:
+        state = json.loads(raw) if raw else {}
+        return {"tat": state.get("tat", now), "strikes": state.get("strikes", 0), "last_429": state.get("last_429", 0.0)}
+
+    def acquire(self, provider: str, api_key: Optional[str], max_wait: Optional[float] = None) -> float:
+        """
+        Reserva a próxima vaga e espera por ela. Retorna o tempo esperado (s).
+        Levanta RateLimitExceeded se a espera passaria de max_wait (nada é reservado).
+        """
+        interval = self.interval(provider)
+        if interval is None:
+            return 0.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+        bucket = self.bucket(provider, api_key)
+        tolerance = (self.burst - 1) * interval
+        stats = self._bucket_stats(bucket)
+
+        def reserve(raw):
+            now = time.time()
+            state = self._load(raw, now)
+            tat = max(state["tat"], now)
+            wait = max(0.0, tat - tolerance - now)
+            if wait > max_wait:
+                return json.dumps(state), (False, wait)
+            state["tat"] = tat + interval
+            return json.dumps(state), (True, wait)
+
+        with self._lock:
+            stats.waiting += 1
+            stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        try:
+            try:
+                admitted, wait = self.store.update(f"ratelimit:{bucket}", reserve, _STATE_TTL)
+            except Exception as e:
+                # Sem o armazenamento compartilhado, segue sem limitar (o provedor ainda devolve 429)
+                logger.warning(f"Limitador de requisições indisponível: {e}")
+                return 0.0
+            if not admitted:
+                with self._lock:
+                    stats.rejected += 1
+                raise RateLimitExceeded(provider, wait)
+            if wait > 0:
+                time.sleep(wait)
+            with self._lock:
+                stats.admitted += 1
+                stats.waits.append(wait)
+            return wait
+        finally:
+            with self._lock:
+                stats.waiting -= 1
+
+    def penalize(self, provider: str, api_key: Optional[str]) -> float:
+        """Registra um 429: adia a próxima vaga da chave com backoff exponencial e jitter"""
+        if self.interval(provider) is None:
+            return 0.0
+        bucket = self.bucket(provider, api_key)
+        tolerance = (self.burst - 1) * self.interval(provider)
+
+        def push_back(raw):
+            now = time.time()
+            state = self._load(raw, now)
+            # 429s próximos uns dos outros aumentam o backoff; depois de um tempo calmo ele recomeça
+            recent = now - state["last_429"] < 2 * RATE_LIMIT_BACKOFF_MAX
+            strikes = state["strikes"] + 1 if recent else 1
+            backoff = min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** (strikes - 1))
+            backoff *= random.uniform(0.5, 1.5)
+            # Sem rajada depois do 429: a tolerância do balde é consumida junto
+            state.update(tat=max(state["tat"], now + backoff + tolerance), strikes=strikes, last_429=now)
+            return json.dumps(state), backoff
+
+        stats = self._bucket_stats(bucket)
+        with self._lock:
+            stats.throttled += 1
+        try:
+            backoff = self.store.update(f"ratelimit:{bucket}", push_back, _STATE_TTL)
+        except Exception as e:
+            logger.warning(f"Limitador de requisições indisponível: {e}")
+            return 0.0
+        logger.warning(f"429 de {provider}: próximas requisições adiadas em {backoff:.1f}s")
+        return backoff
+
+    @staticmethod
+    def _percentile(samples, p: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[max(0, math.ceil(p * len(ordered)) - 1)], 3)
+
+    def _backlog(self, bucket: str, interval: float) -> int:
+        """Vagas já reservadas à frente (por todos os workers que compartilham o armazenamento)"""
+        try:
+            raw = self.store.get(f"ratelimit:{bucket}")
+        except Exception:
+            return 0
+        if not raw:
+            return 0
+        ahead = json.loads(raw).get("tat", 0) - time.time() - (self.burst - 1) * interval
+        return max(0, math.ceil(ahead / interval))
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = {
+                name: (s.admitted, s.rejected, s.throttled, s.waiting, s.max_waiting, list(s.waits))
+                for name, s in self._stats.items()
+            }
+        result = {}
+        for name, (admitted, rejected, throttled, waiting, max_waiting, waits) in buckets.items():
+            provider = name.split(":", 1)[0]
+            interval = self.interval(provider)
+            result[name] = {
+                "rpm": self.limits.get(provider),
+                "effective_rpm": round(60.0 / interval, 1) if interval else None,
+                "queue_depth": waiting,
+                "max_queue_depth": max_waiting,
+                "backlog": self._backlog(name, interval) if interval else 0,
+                "admitted": admitted,
+                "rejected": rejected,
+                "throttled_429": throttled,
+                "wait": {
+                    "p50": self._percentile(waits, 0.5),
+                    "p95": self._percentile(waits, 0.95),
+                    "max": round(max(waits), 3) if waits else None,
+                },
+            }
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend,
+            "burst": self.burst,
+            "max_wait": self.max_wait,
+            "buckets": result,
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,108 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from services.kv_store import get_store
+
+logger = logging.getLogger(__name__)
+
+# Memoização das chamadas utilitárias de LLM (título, insight, dúvidas)
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory").lower()  # memory | sqlite
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "21600"))
+
+
+class ResultCache:
+    """
+    Resultados de funções puras (a saída só depende do texto de entrada), indexados pelo
+    hash do conteúdo dos argumentos. O backend vem de services/kv_store.py.
+    """
+
+    def __init__(self, backend: str = RESULT_CACHE_BACKEND, ttl: float = RESULT_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._store = None
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = get_store(self.backend)
+        return self._store
+
+    def _count(self, counters: Dict[str, int], namespace: str):
+        # Chamado por várias threads ao mesmo tempo (rotas e executor do llm_async)
+        with self._lock:
+            counters[namespace] = counters.get(namespace, 0) + 1
+
+    @staticmethod
+    def key(namespace: str, args: tuple, kwargs: dict) -> str:
+        payload = json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+        return f"memo:{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def memoize(
+        self,
+        namespace: str,
+        ttl: Optional[float] = None,
+        cache_if: Callable[[Any], bool] = lambda result: True,
+    ):
+        """
+        Decorator. `cache_if` evita guardar respostas de fallback/erro, que devem ser
+        tentadas de novo na próxima chamada.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                cache_key = self.key(namespace, args, kwargs)
+                try:
+                    cached = self.store.get(cache_key)
+                except Exception as e:
+                    logger.warning(f"Cache de resultados indisponível: {e}")
+                    return func(*args, **kwargs)
+                if cached is not None:
+                    self._count(self.hits, namespace)
+                    return json.loads(cached)
+
+                self._count(self.misses, namespace)
+                result = func(*args, **kwargs)
+                if cache_if(result):
+                    try:
+                        self.store.set(cache_key, json.dumps(result, ensure_ascii=False), self.ttl if ttl is None else ttl)
+                    except Exception as e:
+                        logger.warning(f"Falha ao gravar no cache de resultados: {e}")
+                return result
+
+            wrapper.uncached = func
+            return wrapper
+
+        return decorator
+
+    def clear(self):
+        self.store.clear("memo:")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = dict(self.hits), dict(self.misses)
+        return {
+            "backend": self.backend,
+            "ttl": self.ttl,
+            "functions": {
+                name: {
+                    "hits": hits.get(name, 0),
+                    "misses": misses.get(name, 0),
+                    "hit_rate": round(hits.get(name, 0) / (hits.get(name, 0) + misses.get(name, 0)), 4),
+                }
+                for name in sorted(set(hits) | set(misses))
+            },
+        }
+
+
+result_cache = ResultCache()
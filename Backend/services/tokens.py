@@ -0,0 +1,55 @@
+import re
+import logging
+from typing import List
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Contagem de tokens compartilhada (chunker do RAG, empacotamento de contexto, histórico do chat)
+_encoder = None
+
+
+class _WordEncoder:
+    """Aproximação usada quando o BPE do tiktoken não pode ser carregado (ex: servidor sem internet)"""
+
+    _token_re = re.compile(r"\S+\s*")
+
+    def encode(self, text: str) -> List[str]:
+        return self._token_re.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+def get_encoder():
+    global _encoder
+    if _encoder is None:
+        try:
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(
+                f"BPE cl100k_base do tiktoken indisponível ({e}): os tokens serão contados por palavra, "
+                "o que subestima o tamanho dos textos. Aponte TIKTOKEN_CACHE_DIR para o arquivo já baixado "
+                "para usar a contagem exata."
+            )
+            _encoder = _WordEncoder()
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    """'cl100k_base' ou 'palavras' (aproximação): contagens feitas com um e outro são diferentes"""
+    return "palavras" if isinstance(get_encoder(), _WordEncoder) else "cl100k_base"
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Corta o texto nos primeiros max_tokens tokens"""
+    encoder = get_encoder()
+    tokens = encoder.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
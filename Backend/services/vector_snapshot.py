@@ -0,0 +1,210 @@
+import json
+import mmap
+import os
+import shutil
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Linhas da matriz processadas por vez na busca (limita a memória temporária do int8 -> float32)
+SEARCH_BLOCK_ROWS = int(os.getenv("RAG_SNAPSHOT_BLOCK_ROWS", "65536"))
+# Página de leitura da coleção do Chroma durante a exportação
+EXPORT_PAGE_SIZE = 1000
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_DTYPES = ("float32", "int8")
+
+# Arquivos do snapshot:
+#   meta.json      versão, dimensão, dtype, backend de embedding e lista de normas
+#   vectors.npy    matriz contígua N x D (float32 ou int8)
+#   scales.npy     escala por linha (só int8: v ~= q * scale)
+#   norms.npy      ||v||² de cada linha (distância L2² igual à do Chroma)
+#   laws.npy       índice da norma de cada linha em meta["laws"] (-1 = sem norma)
+#   offsets.npy    N+1 offsets em docs.bin
+#   docs.bin       registros JSON {id, text, metadata} concatenados
+
+
+def export_snapshot(collections: Iterable, path: str, dtype: str = "float32", embedding_backend: str = "") -> int:
+    """
+    Exporta embeddings, ids, textos e metadados das coleções para um snapshot somente-leitura.
+    Escreve em um diretório temporário e troca no final, então workers que já mapearam
+    a versão anterior continuam válidos (os arquivos antigos só somem quando forem fechados).
+    Retorna o nº de vetores exportados.
+    """
+    if dtype not in SNAPSHOT_DTYPES:
+        raise ValueError(f"dtype do snapshot deve ser um de {SNAPSHOT_DTYPES}")
+
+    ids: List[str] = []
+    vectors: List[np.ndarray] = []
+    records: List[bytes] = []
+    laws: List[Optional[str]] = []
+    for collection in collections:
+        total = collection.count()
+        for offset in range(0, total, EXPORT_PAGE_SIZE):
+            page = collection.get(
+                limit=EXPORT_PAGE_SIZE,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            for doc_id, embedding, text, metadata in zip(
+                page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+            ):
+                metadata = metadata or {}
+                ids.append(doc_id)
+                vectors.append(np.asarray(embedding, dtype=np.float32))
+                laws.append(metadata.get("law"))
+                records.append(json.dumps(
+                    {"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False
+                ).encode("utf-8"))
+
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    law_names = sorted({law for law in laws if law})
+    law_codes = np.array([law_names.index(law) if law else -1 for law in laws], dtype=np.int16)
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "norms.npy"), np.einsum("ij,ij->i", matrix, matrix).astype(np.float32))
+    if dtype == "int8":
+        # Quantização simétrica por linha
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        np.save(os.path.join(tmp_path, "vectors.npy"), quantized)
+        np.save(os.path.join(tmp_path, "scales.npy"), scales.astype(np.float32))
+    else:
+        np.save(os.path.join(tmp_path, "vectors.npy"), matrix)
+    np.save(os.path.join(tmp_path, "laws.npy"), law_codes)
+
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    with open(os.path.join(tmp_path, "docs.bin"), "wb") as f:
+        for i, record in enumerate(records):
+            f.write(record)
+            offsets[i + 1] = offsets[i] + len(record)
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "count": len(ids),
+            "dim": int(matrix.shape[1]) if len(ids) else 0,
+            "dtype": dtype,
+            "embedding_backend": embedding_backend,
+            "laws": law_names,
+            "created_at": time.time(),
+        }, f)
+
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return len(ids)
+
+
+class VectorSnapshot:
+    """
+    Busca vetorial somente-leitura sobre um snapshot exportado.
+    Os arquivos são abertos com mmap: vários workers compartilham as mesmas páginas
+    pelo cache do sistema operacional, sem abrir o SQLite do Chroma.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Versão de snapshot não suportada: {self.meta.get('version')}")
+
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self.law_codes = np.load(os.path.join(path, "laws.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.scales = (
+            np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+            if self.meta["dtype"] == "int8" else None
+        )
+        self._docs_file = open(os.path.join(path, "docs.bin"), "rb")
+        size = os.fstat(self._docs_file.fileno()).st_size
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VectorSnapshot"]:
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        return cls(path)
+
+    @property
+    def embedding_backend(self) -> str:
+        return self.meta.get("embedding_backend", "")
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def get(self, row: int) -> Dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(bytes(self._docs[start:end]).decode("utf-8"))
+
+    def _law_mask(self, laws: Optional[Iterable[str]], start: int, end: int) -> Optional[np.ndarray]:
+        if laws is None:
+            return None
+        names = self.meta.get("laws", [])
+        codes = [names.index(law) for law in laws if law in names]
+        return np.isin(self.law_codes[start:end], codes)
+
+    def search(self, embedding, n_results: int = 3, laws: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Top-k por distância L2² (a mesma métrica padrão do Chroma), vetorizado em NumPy.
+        Retorna hits no mesmo formato do RAGService ({"id", "text", "metadata", "score"}).
+        """
+        total = len(self)
+        if not total or n_results <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(query @ query)
+        laws = list(laws) if laws is not None else None
+
+        candidate_rows, candidate_distances = [], []
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, total)
+            block = self.vectors[start:end]
+            if self.scales is not None:
+                dots = (block.astype(np.float32) @ query) * self.scales[start:end]
+            else:
+                dots = block @ query
+            distances = self.norms[start:end] - 2.0 * dots + query_norm
+
+            mask = self._law_mask(laws, start, end)
+            if mask is not None:
+                distances = np.where(mask, distances, np.inf)
+
+            k = min(n_results, end - start)
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.isfinite(distances[top])]
+            candidate_rows.append(top + start)
+            candidate_distances.append(distances[top])
+
+        rows = np.concatenate(candidate_rows)
+        distances = np.concatenate(candidate_distances)
+        order = np.argsort(distances, kind="stable")[:n_results]
+
+        hits = []
+        for row, distance in zip(rows[order], distances[order]):
+            doc = self.get(int(row))
+            hits.append({
+                "id": doc["id"],
+                "text": doc["text"],
+                "metadata": doc["metadata"],
+                "score": 1.0 / (1.0 + max(float(distance), 0.0)),
+            })
+        return hits
+
+    def close(self):
+        if isinstance(self._docs, mmap.mmap):
+            self._docs.close()
+        self._docs_file.close()
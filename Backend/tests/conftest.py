@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos do backend são importados como "services.x" (mesmo layout do app.py)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
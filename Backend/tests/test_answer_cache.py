@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from services.answer_cache import SemanticAnswerCache
+from services.rag_service import RAGService
+
+
+def _cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache(embed=lambda q: np.array([1.0, float(len(q))]), enabled=True)
+
+
+def test_reindexing_the_collection_purges_stored_answers(monkeypatch):
+    cache = _cache()
+    monkeypatch.setattr(RAGService, "_invalidation_listeners", [cache.purge])
+    cache.store("gemini", "O que diz o art. 7 da CF?", "resposta antiga")
+    assert cache.lookup("gemini", "O que diz o art. 7 da CF?") == "resposta antiga"
+
+    RAGService.invalidate_caches()
+
+    assert cache.lookup("gemini", "O que diz o art. 7 da CF?") is None
+
+
+def test_a_stamp_written_by_another_process_purges_stored_answers(monkeypatch, tmp_path):
+    cache = _cache()
+    stamp = tmp_path / "ingest.stamp"
+    stamp.write_text("1")
+    monkeypatch.setattr(RAGService, "_invalidation_listeners", [cache.purge])
+    monkeypatch.setattr(RAGService, "stamp_path", str(stamp))
+    monkeypatch.setattr(RAGService, "_seen_stamp", None)
+    RAGService.check_ingest_stamp()
+    cache.store("gemini", "pergunta", "resposta")
+
+    stamp.write_text("2")
+    os.utime(stamp, (RAGService._seen_stamp + 10, RAGService._seen_stamp + 10))
+    RAGService.check_ingest_stamp()
+
+    assert cache.lookup("gemini", "pergunta") is None
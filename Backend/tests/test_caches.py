@@ -0,0 +1,50 @@
+import time
+
+from services.cache_service import LRUCache, TTLCache, normalize_query
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_lru_with_zero_size_stores_nothing():
+    cache = LRUCache(max_size=0)
+    cache.set("a", 1)
+    assert len(cache) == 0
+    assert cache.get("a", "padrão") == "padrão"
+
+
+def test_ttl_entries_expire():
+    cache = TTLCache(max_size=10, ttl=0.05)
+    cache.set("curto", 1)
+    cache.set("longo", 2, ttl=10)
+    time.sleep(0.06)
+
+    assert cache.get("curto") is None
+    assert cache.get("longo") == 2
+    # O item vencido é removido na leitura
+    assert len(cache) == 1
+
+
+def test_delete_and_clear_prefix():
+    cache = TTLCache(max_size=10, ttl=10)
+    for key in ("rl:a", "rl:b", "chat:1"):
+        cache.set(key, 1)
+    cache.delete("rl:a")
+    cache.delete("inexistente")
+
+    assert cache.clear_prefix("rl:") == 1
+    assert cache.get("rl:b") is None
+    assert cache.get("chat:1") == 1
+
+
+def test_normalize_query_ignores_case_spaces_and_final_punctuation():
+    assert normalize_query("  Qual o prazo   do Aviso Prévio?? ") == "qual o prazo do aviso prévio"
@@ -0,0 +1,74 @@
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+
+from services import chat_history  # noqa: E402
+
+
+class FakeChatDAO:
+    """Chat e mensagens em memória, com a mesma interface usada pelo chat_history"""
+
+    def __init__(self, turns: int):
+        self.chat = SimpleNamespace(id=1, history_summary=None, summary_user_message_id=None, summary_ai_message_id=None)
+        self.messages = []
+        for i in range(1, turns + 1):
+            self.messages.append({"id": i, "role": "user", "content": f"pergunta {i}"})
+            self.messages.append({"id": i, "role": "assistant", "content": f"resposta {i}"})
+
+    def get_chat_by_id(self, chat_id):
+        return self.chat if chat_id == self.chat.id else None
+
+    def get_messages_after(self, chat_id, user_message_id=None, ai_message_id=None):
+        cursors = {"user": user_message_id or 0, "assistant": ai_message_id or 0}
+        return [dict(m) for m in self.messages if m["id"] > cursors[m["role"]]]
+
+    def update_history_summary(self, chat_id, summary, user_message_id, ai_message_id):
+        self.chat.history_summary = summary
+        self.chat.summary_user_message_id = user_message_id
+        self.chat.summary_ai_message_id = ai_message_id
+
+
+@pytest.fixture
+def dao(monkeypatch):
+    dao = FakeChatDAO(turns=10)
+    monkeypatch.setattr(chat_history, "ChatDAO", dao)
+    monkeypatch.setattr(chat_history, "HISTORY_MAX_MESSAGES", 6)
+    return dao
+
+
+def test_history_is_capped_without_calling_the_llm(dao, monkeypatch):
+    monkeypatch.setattr(chat_history, "summarize_conversation", lambda *args: pytest.fail("resumo no caminho da resposta"))
+
+    history = chat_history.build_history(1)
+
+    assert [m["content"] for m in history] == [
+        "pergunta 8", "resposta 8", "pergunta 9", "resposta 9", "pergunta 10", "resposta 10",
+    ]
+
+
+def test_fold_moves_the_id_cursors_and_summary_is_sent_as_context(dao, monkeypatch):
+    folded = []
+    monkeypatch.setattr(
+        chat_history, "summarize_conversation", lambda previous, messages: folded.extend(messages) or "resumo"
+    )
+    chat_history.build_history(1)
+
+    future = chat_history.schedule_fold(SimpleNamespace(app_context=contextlib.nullcontext), 1)
+
+    assert future.result(timeout=5) is True
+    assert len(folded) == 17
+    assert (dao.chat.summary_user_message_id, dao.chat.summary_ai_message_id) == (9, 8)
+    history = chat_history.build_history(1)
+    assert history[0] == {"role": "system", "content": f"{chat_history.SUMMARY_PREFIX}\nresumo"}
+    assert [m["content"] for m in history[1:]] == ["resposta 9", "pergunta 10", "resposta 10"]
+
+
+def test_failed_fold_keeps_the_cursors(dao, monkeypatch):
+    monkeypatch.setattr(chat_history, "summarize_conversation", lambda *args: None)
+
+    assert chat_history.fold_history(1) is False
+    assert dao.chat.summary_user_message_id is None
+    assert len(chat_history.build_history(1)) == 6
@@ -0,0 +1,61 @@
+import pytest
+
+from services.citation_index import CitationIndex, parse_citations
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("Qual o prazo do art. 477 da CLT?", [("CLT", "477")]),
+        ("CLT, art. 7º-A", [("CLT", "7-A")]),
+        ("o art. 1.228 do Código Civil", [("CC", "1228")]),
+        ("arts. 186 e 187 do Código Civil", [("CC", "186"), ("CC", "187")]),
+        ("arts. 5, 6 e 7 da CF", [("CF", "5"), ("CF", "6"), ("CF", "7")]),
+        ("Súmula 331 do TST", [("TST", "Súmula 331")]),
+        ("súmulas 331 e 85 do TST", [("TST", "Súmula 331"), ("TST", "Súmula 85")]),
+        # Sem tribunal nomeado, a súmula é do TST (a única base de súmulas indexada)
+        ("súmula 85 sobre compensação de jornada", [("TST", "Súmula 85")]),
+    ],
+)
+def test_explicit_citations(query, expected):
+    citations, _ = parse_citations(query)
+    assert citations == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "Súmula Vinculante 13 sobre nepotismo",
+        "Súmula 7 do STJ",
+        "a súmula 331, segundo o STF",
+    ],
+)
+def test_other_courts_sumulas_go_to_semantic_search(query):
+    citations, remainder = parse_citations(query)
+    assert citations == []
+    assert remainder == query
+
+
+def test_cited_text_is_removed_from_the_remainder():
+    citations, remainder = parse_citations("arts. 186 e 187 do Código Civil sobre dano moral")
+    assert citations == [("CC", "186"), ("CC", "187")]
+    assert "186" not in remainder and "187" not in remainder
+    assert remainder.endswith("sobre dano moral")
+
+
+def test_article_without_law_stays_in_the_remainder():
+    citations, remainder = parse_citations("o que diz o art. 5?")
+    assert citations == []
+    assert remainder == "o que diz o art. 5?"
+
+
+def test_index_lookup_keeps_parts_in_order():
+    index = CitationIndex(path="unused.json")
+    index.upsert(
+        ["clt.txt_477_10", "clt.txt_477_0", "clt.txt_477_2"],
+        [{"law": "CLT", "article": "477"}] * 3,
+    )
+    assert index.lookup("CLT", "477") == ["clt.txt_477_0", "clt.txt_477_2", "clt.txt_477_10"]
+
+    index.delete(["clt.txt_477_0", "clt.txt_477_2", "clt.txt_477_10"])
+    assert index.lookup("CLT", "477") == []
@@ -0,0 +1,67 @@
+import pytest
+
+import services.context_packer as context_packer
+from services.context_packer import pack_context
+from services.tokens import count_tokens
+
+
+def _hit(doc_id: str, text: str, article: str = "", part: int = 0, source: str = "clt.txt") -> dict:
+    return {"id": doc_id, "text": text, "metadata": {"source": source, "article": article, "part": part}}
+
+
+def test_adjacent_parts_of_an_article_are_merged_without_the_overlap():
+    overlap = "a multa é devida em caso de atraso no pagamento"
+    hits = [
+        _hit("clt.txt_477_1", f"Art. 477 (cont.)\n{overlap} das verbas rescisórias.", "477", 1),
+        _hit("clt.txt_477_0", f"Art. 477 Na extinção do contrato, {overlap}", "477", 0),
+    ]
+
+    packed = pack_context(hits, token_budget=1000)
+
+    assert len(packed) == 1
+    assert packed[0]["text"] == f"Art. 477 Na extinção do contrato, {overlap} das verbas rescisórias."
+
+
+def test_repeated_labels_in_the_same_file_are_not_merged_or_dropped():
+    hits = [
+        _hit("cf.txt_1_0", "Art. 1º A República Federativa do Brasil, formada pela união indissolúvel", "1", 0, "cf.txt"),
+        _hit("cf.txt_1_1_0", "Art. 1º O Presidente da República e os membros do Congresso prestarão compromisso", "1", 0, "cf.txt"),
+    ]
+
+    packed = pack_context(hits, token_budget=1000)
+
+    assert [hit["id"] for hit in packed] == ["cf.txt_1_0", "cf.txt_1_1_0"]
+
+
+def test_near_duplicates_are_dropped():
+    text = "o empregado dispensado sem justa causa tem direito ao aviso prévio proporcional ao tempo de serviço"
+    hits = [
+        _hit("clt.txt_487_0", text + " na forma da lei", "487"),
+        _hit("cf.txt_7_3", text, "7", 3, "cf.txt"),
+        _hit("cdc.txt_6_0", "são direitos básicos do consumidor a proteção da vida e da saúde", "6", 0, "cdc.txt"),
+    ]
+
+    packed = pack_context(hits, token_budget=1000)
+
+    assert [hit["id"] for hit in packed] == ["clt.txt_487_0", "cdc.txt_6_0"]
+
+
+def test_budget_is_filled_in_relevance_order(monkeypatch):
+    monkeypatch.setattr(context_packer, "NEAR_DUPLICATE_THRESHOLD", 1.1)
+    long_text = " ".join(f"palavra{i}" for i in range(200))
+    hits = [
+        _hit("a.txt_1_0", "primeiro trecho curto e relevante", "1", source="a.txt"),
+        _hit("b.txt_1_0", long_text, "1", source="b.txt"),
+        _hit("c.txt_1_0", "terceiro trecho curto", "1", source="c.txt"),
+    ]
+    budget = sum(count_tokens(h["text"]) + count_tokens(f"--- FONTE: {h['metadata']['source']} ---") for h in (hits[0], hits[2]))
+
+    packed = pack_context(hits, token_budget=budget)
+
+    # O trecho longo não cabe e fica de fora; o seguinte, que cabe, ainda entra
+    assert [hit["id"] for hit in packed] == ["a.txt_1_0", "c.txt_1_0"]
+
+
+@pytest.mark.parametrize("budget", [0, 1])
+def test_nothing_fits_in_a_tiny_budget(budget):
+    assert pack_context([_hit("a.txt_1_0", "texto", "1")], token_budget=budget) == []
@@ -0,0 +1,53 @@
+from services.ingest_manifest import IngestManifest, content_hash
+
+
+def test_diff_reports_changed_and_removed_chunks():
+    manifest = IngestManifest()
+    manifest.update_file("clt.txt", "h1", {"clt.txt_1_0": "a", "clt.txt_2_0": "b", "clt.txt_3_0": "c"})
+
+    changed, removed = manifest.diff_chunks(
+        "clt.txt", {"clt.txt_1_0": "a", "clt.txt_2_0": "b2", "clt.txt_4_0": "d"}
+    )
+
+    assert sorted(changed) == ["clt.txt_2_0", "clt.txt_4_0"]
+    assert removed == ["clt.txt_3_0"]
+
+
+def test_new_file_has_every_chunk_changed():
+    changed, removed = IngestManifest().diff_chunks("cdc.txt", {"cdc.txt_1_0": "a"})
+    assert (changed, removed) == (["cdc.txt_1_0"], [])
+
+
+def test_file_unchanged_compares_the_file_hash():
+    manifest = IngestManifest()
+    manifest.update_file("clt.txt", content_hash("texto"), {})
+
+    assert manifest.file_unchanged("clt.txt", content_hash("texto"))
+    assert not manifest.file_unchanged("clt.txt", content_hash("texto novo"))
+    assert not manifest.file_unchanged("cdc.txt", content_hash("texto"))
+
+
+def test_remove_file_returns_its_chunk_ids():
+    manifest = IngestManifest()
+    manifest.update_file("clt.txt", "h", {"clt.txt_1_0": "a", "clt.txt_2_0": "b"})
+
+    assert sorted(manifest.remove_file("clt.txt")) == ["clt.txt_1_0", "clt.txt_2_0"]
+    assert manifest.sources() == []
+    assert manifest.remove_file("clt.txt") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "data" / "ingest_manifest.json")
+    manifest = IngestManifest(path)
+    manifest.update_file("clt.txt", "h", {"clt.txt_1_0": "a"})
+    manifest.save()
+
+    loaded = IngestManifest.load(path)
+    assert loaded.files == manifest.files
+
+
+def test_corrupted_manifest_loads_empty(tmp_path):
+    path = tmp_path / "ingest_manifest.json"
+    path.write_text("{não é json", encoding="utf-8")
+
+    assert IngestManifest.load(str(path)).sources() == []
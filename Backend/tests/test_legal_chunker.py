@@ -0,0 +1,64 @@
+from services.legal_chunker import chunk_legal_text
+from services.tokens import count_tokens
+
+
+def _law(*articles: str) -> str:
+    return "FONTE: Lei de teste\n" + "\n".join(articles)
+
+
+def test_one_chunk_per_article_with_stable_ids():
+    text = _law(
+        "Art. 1º O empregado tem direito a férias.",
+        "Art. 2º O empregador deve pagar o salário.",
+        "Parágrafo único. O pagamento é mensal.",
+    )
+    chunks = chunk_legal_text(text, "lei.txt", max_tokens=200, overlap_tokens=0)
+
+    assert [c["id"] for c in chunks] == ["lei.txt_1_0", "lei.txt_2_0"]
+    assert chunks[1]["text"].endswith("O pagamento é mensal.")
+    assert chunks[0]["metadata"]["article"] == "1"
+    # O preâmbulo ("FONTE: ...") não vira chunk quando há artigos
+    assert all("FONTE" not in c["text"] for c in chunks)
+
+
+def test_editing_an_article_only_changes_its_chunks():
+    before = chunk_legal_text(_law("Art. 1º Texto original.", "Art. 2º Outro artigo."), "lei.txt")
+    after = chunk_legal_text(_law("Art. 1º Texto alterado.", "Art. 2º Outro artigo."), "lei.txt")
+
+    assert [c["id"] for c in before] == [c["id"] for c in after]
+    assert before[0]["text"] != after[0]["text"]
+    assert before[1] == after[1]
+
+
+def test_repeated_article_labels_get_a_suffix():
+    chunks = chunk_legal_text(_law("Art. 1º Primeiro.", "Art. 1º Repetido (ADCT)."), "cf.txt")
+    assert [c["id"] for c in chunks] == ["cf.txt_1_0", "cf.txt_1_1_0"]
+
+
+def test_sumula_is_a_unit():
+    chunks = chunk_legal_text("Súmula 331 do TST\nTexto da súmula.", "sumulas.txt")
+    assert chunks[0]["metadata"]["article"] == "Súmula 331"
+    assert chunks[0]["id"] == "sumulas.txt_Súmula_331_0"
+
+
+def test_long_article_respects_max_tokens_and_keeps_heading():
+    incisos = [f"{roman} - inciso com bastante texto para encher o chunk " * 3 for roman in ("I", "II", "III", "IV", "V")]
+    oversized = "VI - " + "palavra " * 150
+    text = _law("Art. 7º São direitos dos trabalhadores:", *incisos, oversized, "VII - último inciso.")
+    max_tokens = 60
+
+    chunks = chunk_legal_text(text, "cf.txt", max_tokens=max_tokens, overlap_tokens=10)
+
+    assert len(chunks) > 3
+    assert [c["metadata"]["part"] for c in chunks] == list(range(len(chunks)))
+    assert all(count_tokens(c["text"]) <= max_tokens for c in chunks)
+    assert chunks[0]["text"].startswith("Art. 7º")
+    # Inclusive os chunks depois da parte que precisou ser cortada em janelas
+    assert all(c["text"].startswith("Art. 7 (cont.)") for c in chunks[1:])
+    assert chunks[-1]["text"].endswith("VII - último inciso.")
+
+
+def test_text_without_articles_is_chunked_as_plain_text():
+    chunks = chunk_legal_text("Um texto qualquer sem dispositivos.", "nota.txt")
+    assert [c["id"] for c in chunks] == ["nota.txt_texto_0"]
+    assert chunks[0]["metadata"]["article"] == ""
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from services.model_catalog import ModelCatalog
+
+
+class Loader:
+    def __init__(self, *results, delay: float = 0.0):
+        self.results = list(results)
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls > 1:
+            time.sleep(self.delay)
+        result = self.results[min(self.calls, len(self.results)) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _wait_refresh(catalog: ModelCatalog):
+    deadline = time.time() + 2
+    while catalog.stats()["refreshing"] and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_fresh_catalog_is_served_from_memory():
+    loader = Loader(["gemini-2.5-flash"])
+    catalog = ModelCatalog(loader, ttl=60, snapshot_path=None)
+
+    assert catalog.get() == ["gemini-2.5-flash"]
+    assert catalog.get() == ["gemini-2.5-flash"]
+    assert loader.calls == 1
+    assert catalog.stats()["fresh_hits"] == 1
+
+
+def test_stale_catalog_is_served_while_refreshing_in_background():
+    loader = Loader(["antigo"], ["novo"], delay=0.1)
+    catalog = ModelCatalog(loader, ttl=0.01, max_stale=60, snapshot_path=None)
+    catalog.get()
+    time.sleep(0.02)
+
+    assert catalog.get() == ["antigo"]
+    assert catalog.stats()["refreshing"]
+    _wait_refresh(catalog)
+    assert catalog.get() == ["novo"]
+    assert catalog.stats()["stale_hits"] >= 1
+
+
+def test_failed_refresh_keeps_previous_catalog():
+    loader = Loader(["gpt-4o-mini"], RuntimeError("API fora do ar"))
+    catalog = ModelCatalog(loader, ttl=0.01, max_stale=0.02, snapshot_path=None)
+    catalog.get()
+    time.sleep(0.03)
+
+    assert catalog.get() == ["gpt-4o-mini"]
+    assert catalog.stats()["refresh_failures"] == 1
+    assert catalog.stats()["last_error"] == "API fora do ar"
+
+
+def test_first_load_failure_is_raised():
+    catalog = ModelCatalog(Loader(RuntimeError("sem chave")), snapshot_path=None)
+    with pytest.raises(RuntimeError):
+        catalog.get()
+
+
+def test_snapshot_is_shared_between_workers_of_the_same_scope(tmp_path):
+    path = str(tmp_path / "model_catalog.json")
+    ModelCatalog(Loader(["gemini-2.5-flash"]), snapshot_path=path, scope="chaves").get()
+
+    other_worker = Loader(["não deveria consultar"])
+    assert ModelCatalog(other_worker, snapshot_path=path, scope="chaves").get() == ["gemini-2.5-flash"]
+    assert other_worker.calls == 0
+
+    other_scope = Loader(["outra configuração"])
+    assert ModelCatalog(other_scope, snapshot_path=path, scope="outras").get() == ["outra configuração"]
@@ -0,0 +1,145 @@
+import time
+
+import pytest
+
+import services.provider_router as provider_router_module
+from services.fake_llm import FakeProviderError
+from services.provider_router import HEDGE_MIN_SAMPLES, Attempt, CircuitBreaker, ProviderRouter
+from services.rate_limiter import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(provider_router_module, "rate_limiter", RateLimiter(enabled=False))
+
+
+def _fail(error=None):
+    def func():
+        raise error or RuntimeError("provedor fora do ar")
+    return func
+
+
+def _trip(breaker: CircuitBreaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    _trip(breaker)
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    _trip(breaker)
+    time.sleep(0.06)
+
+    # available() só consulta; a tentativa de teste é consumida por allow()
+    assert breaker.available() and breaker.state == "open"
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.trips == 2
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failover_to_the_next_provider():
+    router = ProviderRouter(hedging=False)
+
+    assert router.call([Attempt("gemini", _fail()), Attempt("openai", lambda: "ok")]) == "ok"
+
+    stats = router.stats()["providers"]
+    assert stats["gemini"]["failures"] == 1
+    assert stats["openai"]["failovers"] == 1
+    assert stats["openai"]["successes"] == 1
+
+
+def test_last_error_is_raised_when_every_provider_fails():
+    router = ProviderRouter(hedging=False)
+    with pytest.raises(ValueError):
+        router.call([Attempt("gemini", _fail()), Attempt("openai", _fail(ValueError("ruim")))])
+
+
+def test_rate_limited_call_is_retried_on_the_same_provider():
+    router = ProviderRouter(hedging=False)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise FakeProviderError("429")
+        return "ok"
+
+    assert router.call([Attempt("gemini", flaky), Attempt("openai", lambda: "reserva")]) == "ok"
+    assert len(calls) == 2
+    assert router.stats()["providers"]["gemini"]["failures"] == 0
+
+
+def test_open_breaker_is_skipped_and_fallback_probe_is_not_consumed():
+    router = ProviderRouter(hedging=False)
+    gemini = router._state("gemini").breaker
+    _trip(gemini)
+    openai = router._state("openai").breaker
+    _trip(openai)
+    openai.opened_at -= openai.cooldown
+
+    assert router.call([Attempt("openai", lambda: "principal"), Attempt("gemini", lambda: "reserva")]) == "principal"
+    assert openai.state == "closed"
+
+    # Principal saudável: o breaker vencido do reserva não é tocado
+    _trip(openai)
+    gemini.opened_at -= gemini.cooldown
+    router._state("openai").breaker = CircuitBreaker()
+    router.call([Attempt("openai", lambda: "principal"), Attempt("gemini", lambda: "reserva")])
+    assert gemini.state == "open"
+
+
+def test_no_hedge_without_latency_samples():
+    router = ProviderRouter(hedging=True)
+    slow = lambda: time.sleep(0.2) or "principal"
+
+    assert router.hedge_delay("gemini", "call") is None
+    assert router.call([Attempt("gemini", slow), Attempt("openai", lambda: "reserva")], hedge=True) == "principal"
+    assert router.stats()["providers"]["gemini"]["hedges"] == 0
+
+
+def test_hedge_fires_after_p95_and_loser_is_discarded():
+    router = ProviderRouter(hedging=True)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        router._record("gemini", "call", 0.01)
+    slow = lambda: time.sleep(0.8) or "principal"
+
+    assert router.call([Attempt("gemini", slow), Attempt("openai", lambda: "reserva")], hedge=True) == "reserva"
+    time.sleep(1.0)
+
+    stats = router.stats()["providers"]
+    assert stats["gemini"]["hedges"] == 1
+    assert stats["openai"]["hedge_wins"] == 1
+    assert stats["gemini"]["cancelled"] == 1
+
+
+def test_stream_fails_over_before_the_first_token():
+    router = ProviderRouter(hedging=False)
+
+    def broken_stream():
+        raise RuntimeError("conexão recusada")
+        yield
+
+    tokens = router.stream([Attempt("gemini", broken_stream), Attempt("openai", lambda: iter(["a", "b"]))])
+
+    assert list(tokens) == ["a", "b"]
+    assert router.stats()["providers"]["openai"]["failovers"] == 1
@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+import requests
+from google.api_core.exceptions import ResourceExhausted
+
+from services.fake_llm import FakeProviderError
+from services.rate_limiter import RateLimiter, RateLimitExceeded, is_rate_limit_error
+
+
+def _limiter(rpm: float = 60, burst: int = 2, enabled: bool = True) -> RateLimiter:
+    return RateLimiter(enabled=enabled, backend="memory", limits={"gemini": rpm}, headroom=1.0, burst=burst)
+
+
+def _key() -> str:
+    # Chave nova por teste: o MemoryStore é compartilhado pelo processo
+    return uuid.uuid4().hex
+
+
+def test_burst_is_admitted_then_queue_limit_rejects():
+    limiter, key = _limiter(rpm=60, burst=2), _key()
+
+    assert limiter.acquire("gemini", key, max_wait=0) == 0.0
+    assert limiter.acquire("gemini", key, max_wait=0) == 0.0
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.acquire("gemini", key, max_wait=0)
+    assert excinfo.value.provider == "gemini"
+    assert 0 < excinfo.value.wait <= 1.0
+
+    bucket = limiter.stats()["buckets"][limiter.bucket("gemini", key)]
+    assert (bucket["admitted"], bucket["rejected"]) == (2, 1)
+
+
+def test_requests_wait_for_their_slot():
+    limiter, key = _limiter(rpm=600, burst=1), _key()
+
+    limiter.acquire("gemini", key)
+    waited = limiter.acquire("gemini", key)
+
+    assert 0.05 < waited <= 0.1
+
+
+def test_keys_have_separate_buckets():
+    limiter = _limiter(rpm=60, burst=1)
+    limiter.acquire("gemini", _key(), max_wait=0)
+    assert limiter.acquire("gemini", _key(), max_wait=0) == 0.0
+
+
+def test_penalize_pushes_the_next_slot_back():
+    limiter, key = _limiter(rpm=600, burst=5), _key()
+
+    backoff = limiter.penalize("gemini", key)
+
+    assert backoff > 0
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("gemini", key, max_wait=0)
+
+
+def test_disabled_or_unlimited_provider_never_waits():
+    key = _key()
+    disabled = _limiter(rpm=1, burst=1, enabled=False)
+    for _ in range(5):
+        assert disabled.acquire("gemini", key, max_wait=0) == 0.0
+    assert disabled.penalize("gemini", key) == 0.0
+    # Provedor sem cota configurada
+    assert _limiter().acquire("openai", key, max_wait=0) == 0.0
+
+
+def test_rate_limit_errors_are_matched_by_type_or_status():
+    response = requests.Response()
+    response.status_code = 429
+
+    assert is_rate_limit_error(ResourceExhausted("quota"))
+    assert is_rate_limit_error(requests.HTTPError(response=response))
+    assert is_rate_limit_error(FakeProviderError("erro simulado"))
+    assert not is_rate_limit_error(ValueError("falha ao processar o pedido 429"))
+
+    response.status_code = 500
+    assert not is_rate_limit_error(requests.HTTPError(response=response))
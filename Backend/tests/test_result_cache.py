@@ -0,0 +1,59 @@
+import threading
+import uuid
+
+from services.result_cache import ResultCache
+
+
+def _namespace() -> str:
+    # O MemoryStore é compartilhado pelo processo
+    return f"teste_{uuid.uuid4().hex}"
+
+
+def test_memoize_returns_cached_result_for_same_arguments():
+    cache, namespace, calls = ResultCache(backend="memory"), _namespace(), []
+
+    @cache.memoize(namespace)
+    def title(text):
+        calls.append(text)
+        return text.upper()
+
+    assert title("rescisão") == "RESCISÃO"
+    assert title("rescisão") == "RESCISÃO"
+    assert title("férias") == "FÉRIAS"
+
+    assert calls == ["rescisão", "férias"]
+    assert cache.stats()["functions"][namespace] == {"hits": 1, "misses": 2, "hit_rate": 0.3333}
+
+
+def test_fallback_results_are_not_cached():
+    cache, namespace, calls = ResultCache(backend="memory"), _namespace(), []
+
+    @cache.memoize(namespace, cache_if=lambda result: result != "Nova Conversa")
+    def title(text):
+        calls.append(text)
+        return "Nova Conversa"
+
+    title("oi")
+    title("oi")
+    assert len(calls) == 2
+
+
+def test_counters_are_exact_under_concurrency():
+    cache, namespace = ResultCache(backend="memory"), _namespace()
+
+    @cache.memoize(namespace)
+    def identity(value):
+        return value
+
+    def worker():
+        for i in range(500):
+            identity(i % 10)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counters = cache.stats()["functions"][namespace]
+    assert counters["hits"] + counters["misses"] == 8 * 500